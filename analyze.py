@@ -0,0 +1,204 @@
+import argparse
+import collections
+import contextlib
+import io
+import itertools
+import json
+import os
+import struct
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from bitboard import COLS, COLUMN_BITS, Position, from_board, to_board
+from utils import board_flip
+import play
+
+# ----------- POSITION FILES ----------- #
+# JSONL: one position per line, {"board": ..., "player": ..., "previous_board": ..., "id": ...}
+# with boards as the server sends them (top row first), or {"moves": "3323...", ...} with the
+# columns played from the empty board, X first. player defaults to the player to move with X
+# first, previous_board to the board itself.
+#
+# Binary: header (magic, version, number of records), then records of a position key
+# (Position.key(), uint64) and the player to move (uint8, 0 for X and 1 for O).
+
+MAGIC = b"C4PS"
+VERSION = 1
+HEADER = struct.Struct("<4sHxxI")
+RECORD = struct.Struct("<QB")
+PLAYERS = ("X", "O")
+
+
+def default_player(board):
+    """Returns the player to move on a board, X moving first."""
+    stones = sum(1 for row in board for cell in row if cell != ".")
+    return "X" if stones % 2 == 0 else "O"
+
+
+def position_from_key(key):
+    """Returns the Position of a key of Position.key(): every column of the key holds the X
+    stones of the column plus a bit on top of its highest stone."""
+    position = Position()
+    for col in range(COLS):
+        bits = (key >> (col * COLUMN_BITS)) & ((1 << COLUMN_BITS) - 1)
+        height = bits.bit_length() - 1
+        x_stones = bits - (1 << height)
+        for row in range(height):
+            position.play(col, "X" if x_stones >> row & 1 else "O")
+    return position
+
+
+def read_jsonl(path):
+    """Yields the positions of a JSONL file, one line at a time."""
+    with open(path) as positions:
+        for index, line in enumerate(positions):
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if "board" in entry:
+                board = entry["board"]
+            else:
+                position = Position()
+                for i, col in enumerate(entry["moves"]):
+                    position.play(int(col), PLAYERS[i % 2])
+                board = board_flip(to_board(position))
+            yield {"index": index,
+                "id": entry.get("id", index),
+                "board": board,
+                "previous_board": entry.get("previous_board", board),
+                "player": entry.get("player") or default_player(board)}
+
+
+def read_binary(path):
+    """Yields the positions of a binary file, one record at a time."""
+    with open(path, "rb") as positions:
+        magic, version, count = HEADER.unpack(positions.read(HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("not a position file:", path)
+        for index in range(count):
+            key, player = RECORD.unpack(positions.read(RECORD.size))
+            board = board_flip(to_board(position_from_key(key)))
+            yield {"index": index, "id": index, "board": board, "previous_board": board, "player": PLAYERS[player]}
+
+
+def read_positions(path):
+    """Yields the positions of a JSONL or binary file, recognized by the magic of binary files."""
+    with open(path, "rb") as positions:
+        binary = positions.read(len(MAGIC)) == MAGIC
+    return read_binary(path) if binary else read_jsonl(path)
+
+
+def write_binary(path, positions):
+    """Writes a binary position file from (board, player) pairs, boards top row first.
+
+    Returns:
+        The number of positions written.
+    """
+    count = 0
+    with open(path, "wb") as output:
+        output.write(HEADER.pack(MAGIC, VERSION, 0))
+        for board, player in positions:
+            output.write(RECORD.pack(from_board(board_flip(board)).key(), PLAYERS.index(player)))
+            count += 1
+        # The count is only known at the end, the positions are not kept in memory.
+        output.seek(0)
+        output.write(HEADER.pack(MAGIC, VERSION, count))
+    return count
+
+
+# ----------- ANALYSIS ----------- #
+
+def analyze_position(position, time_budget, mode):
+    """Runs play.play on one position with its prints suppressed.
+
+    Returns:
+        {"index", "id", "column", "score", "engine", "time"}, score being the score of the
+        solver or of the search when one of them chose the move, else None, or
+        {"index", "id", "error", "message"} with the type and message of the exception if
+        play raised.
+    """
+    stats = {}
+    start = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            column = play.play(position["previous_board"], position["board"], position["player"], time_budget, stats=stats, mode=mode)
+    except Exception as error:
+        # Recorded in the output, so that one failing position does not stop the batch.
+        return {"index": position["index"], "id": position["id"], "error": type(error).__name__, "message": str(error)}
+    engine = stats.get("engine")
+    if engine == "solver":
+        score = stats["solver"]["score"]
+    elif engine in ("minimax", "ponder"):
+        score = stats["search"]["score"]
+    else:
+        score = None
+    return {"index": position["index"], "id": position["id"], "column": column, "score": score,
+        "engine": engine, "time": time.perf_counter() - start}
+
+
+def analyze_chunk(chunk, time_budget, mode):
+    return [analyze_position(position, time_budget, mode) for position in chunk]
+
+
+def analyze(positions, time_budget=play.MOVE_TIME, mode="default", workers=None, chunk_size=16, max_pending=None):
+    """Analyzes positions on a process pool.
+
+    Positions are read from the iterable only as workers need them: at most max_pending chunks
+    of chunk_size positions (twice the number of workers by default) are in flight, so memory
+    stays bounded for inputs of any size.
+
+    Yields:
+        The result of analyze_position for every position, in input order.
+    """
+    positions = iter(positions)
+    workers = workers or os.cpu_count() or 1
+    max_pending = max_pending or 2 * workers
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = collections.deque()
+        while True:
+            while len(pending) < max_pending:
+                chunk = list(itertools.islice(positions, chunk_size))
+                if not chunk:
+                    break
+                pending.append(pool.submit(analyze_chunk, chunk, time_budget, mode))
+            if not pending:
+                return
+            yield from pending.popleft().result()
+
+
+def analyze_file(input_path, output_path, time_budget=play.MOVE_TIME, mode="default", workers=None, chunk_size=16):
+    """Analyzes the positions of a JSONL or binary file and writes the results as JSONL, in input order.
+
+    Returns:
+        (number of positions, number of errors)
+    """
+    count = errors = 0
+    with open(output_path, "w") as output:
+        for result in analyze(read_positions(input_path), time_budget, mode, workers, chunk_size):
+            output.write(json.dumps(result) + "\n")
+            count += 1
+            errors += "error" in result
+    return count, errors
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Analyzes the positions of a JSONL or binary file with play.play on a process pool.")
+    parser.add_argument("input", help="JSONL or binary position file")
+    parser.add_argument("output", help="JSONL file to write the results to, - for standard output")
+    parser.add_argument("--move-time", type=float, default=play.MOVE_TIME, help="seconds of thinking per position")
+    parser.add_argument("--mode", default="default", choices=play.MODES)
+    parser.add_argument("--workers", type=int, help="worker processes, one per CPU by default")
+    parser.add_argument("--chunk-size", type=int, default=16, help="positions sent to a worker at once")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.output == "-":
+        count = errors = 0
+        for result in analyze(read_positions(args.input), args.move_time, args.mode, args.workers, args.chunk_size):
+            print(json.dumps(result), flush=True)
+            count += 1
+            errors += "error" in result
+    else:
+        count, errors = analyze_file(args.input, args.output, args.move_time, args.mode, args.workers, args.chunk_size)
+    print("%d positions, %d errors in %.1fs" % (count, errors, time.perf_counter() - start), file=sys.stderr)
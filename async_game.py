@@ -0,0 +1,257 @@
+import argparse
+import asyncio
+import functools
+import json
+import os
+import ssl
+import time
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlencode, urlsplit
+
+from play import play
+
+# ----------- ASYNCIO GAME CLIENT ----------- #
+# Same protocol as game.py, but all the games of the process share a small pool of keep-alive
+# HTTP/1.1 connections, the state is polled with a backoff that adapts to how fast the other
+# player moves, and the engine runs in an executor so that waiting games never block thinking.
+
+BASE_URL = os.environ.get("CONNECT4_SERVER", "https://emarchiori.eu.pythonanywhere.com")
+STUDENT_TOKEN = "VICTORIANOS"
+RETRIES = 10
+
+
+class HTTPError(Exception):
+    """Raised when the server keeps answering with an error status."""
+
+
+class ConnectionPool:
+    """Keep-alive HTTP/1.1 connections to a single server, shared by all the games of a process.
+
+    Only GET requests are supported, which is all the game server needs.
+    """
+
+    def __init__(self, base_url=BASE_URL, max_connections=8, timeout=30.0):
+        parts = urlsplit(base_url)
+        self.https = parts.scheme == "https"
+        self.host = parts.hostname
+        self.port = parts.port or (443 if self.https else 80)
+        self.prefix = parts.path.rstrip("/")
+        self.timeout = timeout
+        self.idle = [] # (reader, writer) of the open connections not in use
+        self.slots = asyncio.Semaphore(max_connections)
+        self.requests = 0
+        self.connections_opened = 0
+
+    async def open(self):
+        self.connections_opened += 1
+        return await asyncio.wait_for(asyncio.open_connection(self.host, self.port,
+            ssl=ssl.create_default_context() if self.https else None), self.timeout)
+
+    async def get(self, path, params):
+        """Sends a GET request, reusing an idle connection if there is one.
+
+        Returns:
+            (status, body bytes)
+        """
+        target = "%s%s?%s" % (self.prefix, path, urlencode(params))
+        async with self.slots:
+            reused = bool(self.idle)
+            connection = self.idle.pop() if reused else await self.open()
+            try:
+                status, keep_alive, body = await asyncio.wait_for(self.request(connection, target), self.timeout)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                connection[1].close()
+                if not reused:
+                    raise
+                # The server closed the idle connection: retry once on a new one.
+                connection = await self.open()
+                try:
+                    status, keep_alive, body = await asyncio.wait_for(self.request(connection, target), self.timeout)
+                except BaseException:
+                    connection[1].close()
+                    raise
+            except BaseException:
+                connection[1].close()
+                raise
+            if keep_alive:
+                self.idle.append(connection)
+            else:
+                connection[1].close()
+            self.requests += 1
+            return status, body
+
+    async def request(self, connection, target):
+        reader, writer = connection
+        writer.write(("GET %s HTTP/1.1\r\nHost: %s\r\nConnection: keep-alive\r\nAccept: application/json\r\n\r\n"
+            % (target, self.host)).encode("latin-1"))
+        await writer.drain()
+
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError("connection closed by the server")
+        version, status = status_line.split()[:2]
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        keep_alive = headers.get("connection", "").lower() != "close" and version == b"HTTP/1.1"
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            body = b""
+            while True:
+                size = int((await reader.readline()).split(b";")[0], 16)
+                if size == 0:
+                    await reader.readline()
+                    break
+                body += await reader.readexactly(size)
+                await reader.readline()
+        elif "content-length" in headers:
+            body = await reader.readexactly(int(headers["content-length"]))
+        else:
+            body = await reader.read()
+            keep_alive = False
+        return int(status), keep_alive, body
+
+    async def close(self):
+        while self.idle:
+            _, writer = self.idle.pop()
+            writer.close()
+
+
+class Backoff:
+    """Polling delays that grow while nothing changes and start again from the shortest one after a change."""
+
+    def __init__(self, initial=0.05, maximum=2.0, factor=1.5):
+        self.initial = initial
+        self.maximum = maximum
+        self.factor = factor
+        self.delay = initial
+
+    def reset(self):
+        self.delay = self.initial
+
+    async def wait(self):
+        await asyncio.sleep(self.delay)
+        self.delay = min(self.maximum, self.delay * self.factor)
+
+
+# ----------- SERVER REQUESTS ----------- #
+
+async def call(pool, path, **params):
+    """Sends a request to the game server, retrying up to RETRIES times, and returns the body."""
+    params = dict({"TOKEN": STUDENT_TOKEN}, **params)
+    for _ in range(RETRIES):
+        status, body = await pool.get(path, params)
+        if status == 200:
+            return body
+        print(body)
+    raise HTTPError("%s failed %d times, last status %d" % (path, RETRIES, status))
+
+async def new_game(pool, game_type, multi_player=False):
+    body = await call(pool, "/new-game", **{"game-type": game_type, "multi-player": "True" if multi_player else "False"})
+    return json.loads(body)["game-id"]
+
+async def join_game(pool, game_type, game_id):
+    body = await call(pool, "/join-game", **{"game-type": game_type, "game-id": game_id})
+    return json.loads(body)["player"]
+
+async def game_state(pool, game_type, game_id):
+    """Returns the game state as a dictionary {"state", "status", "player"}."""
+    return json.loads(await call(pool, "/game-state", **{"game-type": game_type, "game-id": game_id}))
+
+async def update_game(pool, game_type, game_id, player, move):
+    return await call(pool, "/update-game", **{"game-type": game_type, "game-id": game_id, "player": player, "move": json.dumps(move)})
+
+
+# ----------- GAME LOOP ----------- #
+
+def drop(board, col, player):
+    """Returns a copy of a top-first board with a stone of player dropped in col."""
+    board = [row[:] for row in board]
+    for row in reversed(board):
+        if row[col] == ".":
+            row[col] = player
+            break
+    return board
+
+async def game_loop(pool, game_type, executor=None, solver=play, multi_player=False, game_id=None, join_backoff=None, move_backoff=None, verbose=True):
+    """Plays one game like game.game_loop, without blocking the event loop.
+
+    solver(previous_board, board, player) is run in executor (the default executor if None).
+
+    Returns:
+        "winner", "loser" or "draw".
+    """
+    loop = asyncio.get_running_loop()
+    join_backoff = join_backoff or Backoff(initial=0.5, maximum=10.0)
+    move_backoff = move_backoff or Backoff()
+    while game_id is None:
+        game_id = await new_game(pool, game_type, multi_player)
+    player = await join_game(pool, game_type, game_id)
+    if verbose:
+        print("Game %s: playing as %s" % (game_id, player))
+
+    game = await game_state(pool, game_type, game_id)
+    while game["status"] == "waiting":
+        await join_backoff.wait()
+        game = await game_state(pool, game_type, game_id)
+
+    previous_board = json.loads(game["state"])
+    last_state = game["state"]
+    while True:
+        if game["state"] != last_state:
+            move_backoff.reset()
+            last_state = game["state"]
+        if game["status"] == "complete":
+            result = "draw" if game["player"] == "-" else "winner" if game["player"] == player else "loser"
+            if verbose:
+                print("Game %s: %s" % (game_id, result))
+            return result
+        if game["player"] == player:
+            board = json.loads(game["state"])
+            move = await loop.run_in_executor(executor, solver, previous_board, board, player)
+            await update_game(pool, game_type, game_id, player, move)
+            # The next board passed to the solver is compared to the board right after this move.
+            previous_board = drop(board, move, player)
+            move_backoff.reset()
+        else:
+            await move_backoff.wait()
+        game = await game_state(pool, game_type, game_id)
+
+async def run_games(games, game_type, base_url=BASE_URL, workers=None, max_connections=8, multi_player=False, move_time=None, verbose=True):
+    """Plays games concurrent games on one connection pool and one process pool.
+    move_time: time budget of play.play in seconds, its default if None.
+
+    Returns:
+        (results, seconds, number of HTTP requests, connections opened)
+    """
+    pool = ConnectionPool(base_url, max_connections)
+    solver = play if move_time is None else functools.partial(play, time_budget=move_time)
+    start = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = await asyncio.gather(*[game_loop(pool, game_type, executor, solver, multi_player=multi_player, verbose=verbose)
+                for _ in range(games)], return_exceptions=True)
+    finally:
+        await pool.close()
+    return results, time.perf_counter() - start, pool.requests, pool.connections_opened
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Plays concurrent games against the game server.")
+    parser.add_argument("--games", type=int, default=1, help="number of concurrent games")
+    parser.add_argument("--game-type", default="connect4big")
+    parser.add_argument("--server", default=BASE_URL, help="base URL of the game server")
+    parser.add_argument("--workers", type=int, help="engine processes, one per CPU by default")
+    parser.add_argument("--connections", type=int, default=8, help="size of the HTTP connection pool")
+    parser.add_argument("--move-time", type=float, help="seconds of thinking per move")
+    parser.add_argument("--multi-player", action="store_true")
+    args = parser.parse_args()
+
+    results, seconds, requests, connections = asyncio.run(run_games(args.games, args.game_type, args.server,
+        args.workers, args.connections, args.multi_player, args.move_time))
+    print("Results:", results)
+    print("%d games in %.1fs, %d requests on %d connections" % (args.games, seconds, requests, connections))
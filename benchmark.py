@@ -0,0 +1,202 @@
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+
+from bitboard import COLS, ROWS, other_player, to_board
+from groups import CountedPosition
+from utils import board_flip, find_threats
+from rules import diagram6_1, diagram6_5, diagram6_10, diagram8_1, find_rules, rule_table
+from solution import find_all_solutions, compute_all_solutions, solutions_cache
+from victor import create_node_graph, evaluate_cache, find_chosen_set
+from minimax import search
+import play
+
+# ----------- CORPUS ----------- #
+
+DIAGRAMS = {"diagram6_1": diagram6_1, "diagram6_5": diagram6_5, "diagram6_10": diagram6_10, "diagram8_1": diagram8_1}
+
+
+def diagram_player(board):
+    """Returns the player to move on a flipped board, X moving first."""
+    stones = sum(1 for row in board for cell in row if cell != ".")
+    return "X" if stones % 2 == 0 else "O"
+
+
+def random_game(rng, plies):
+    """Plays plies random moves without completing a group.
+
+    Returns:
+        (previous_board, board, player) as flipped boards, player to move on board, or None if
+        the game could not be continued without a win.
+    """
+    position = CountedPosition()
+    player = "X"
+    previous_board = to_board(position)
+    for _ in range(plies):
+        columns = [col for col in range(COLS) if position.heights[col] < ROWS and not position.is_winning_move(col, player)]
+        if not columns:
+            return None
+        previous_board = to_board(position)
+        position.play(rng.choice(columns), player)
+        player = other_player(player)
+    return previous_board, to_board(position), player
+
+
+def build_corpus(seed, plies, positions_per_ply):
+    """Returns the benchmark positions: the diagrams and positions_per_ply random positions for every ply.
+
+    Every position is a dictionary {"name", "ply", "previous_board", "board", "player"} with flipped boards.
+    """
+    corpus = []
+    for name, board in DIAGRAMS.items():
+        corpus.append({"name": name, "ply": "diagrams", "previous_board": board, "board": board, "player": diagram_player(board)})
+    rng = random.Random(seed)
+    for ply in plies:
+        count = 0
+        while count < positions_per_ply:
+            game = random_game(rng, ply)
+            if game is None:
+                continue
+            previous_board, board, player = game
+            corpus.append({"name": "random", "ply": ply, "previous_board": previous_board, "board": board, "player": player})
+            count += 1
+    return corpus
+
+
+# ----------- MEASUREMENTS ----------- #
+
+def clear_caches():
+    """Empties the caches kept between calls, so that every call is timed cold."""
+    solutions_cache.clear()
+    evaluate_cache.clear()
+    rule_table.cache_clear()
+    play.transposition_table.clear()
+
+
+def percentile(samples, fraction):
+    """Returns the nearest-rank percentile of sorted samples."""
+    return samples[max(0, math.ceil(fraction * len(samples)) - 1)]
+
+
+def summarize(samples):
+    """Returns the statistics of a list of times in seconds, in milliseconds."""
+    samples = sorted(samples)
+    if not samples:
+        return {"count": 0}
+    return {"count": len(samples),
+        "min_ms": samples[0] * 1000,
+        "median_ms": percentile(samples, 0.5) * 1000,
+        "p90_ms": percentile(samples, 0.9) * 1000,
+        "p95_ms": percentile(samples, 0.95) * 1000,
+        "p99_ms": percentile(samples, 0.99) * 1000,
+        "max_ms": samples[-1] * 1000,
+        "mean_ms": sum(samples) / len(samples) * 1000}
+
+
+def benchmarks(depths, move_time):
+    """Returns {name: (prepare, run)}: prepare(position) builds the arguments outside of the
+    timing, run(*arguments) is the timed call."""
+    def node_graph_inputs(position):
+        return (find_all_solutions(position["board"], position["player"])[0],)
+
+    def chosen_set_inputs(position):
+        board, player = position["board"], position["player"]
+        return create_node_graph(find_all_solutions(board, player)[0]), set(find_threats(board, player))
+
+    def play_inputs(position):
+        # play takes the boards as sent by the server, top row first.
+        return board_flip(position["previous_board"]), board_flip(position["board"]), position["player"], move_time
+
+    def quiet_play(*arguments):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return play.play(*arguments)
+
+    suite = {
+        "find_threats": (lambda position: (position["board"], position["player"]), find_threats),
+        "find_rules": (lambda position: (position["board"],), find_rules),
+        "find_all_solutions": (lambda position: (position["board"], position["player"]), compute_all_solutions),
+        "create_node_graph": (node_graph_inputs, create_node_graph),
+        "find_chosen_set": (chosen_set_inputs, find_chosen_set),
+    }
+    for depth in depths:
+        suite["minimax_depth_%d" % depth] = (lambda position, depth=depth: (position["board"], position["player"], depth), search)
+    suite["play"] = (play_inputs, quiet_play)
+    return suite
+
+
+def run_benchmarks(corpus, suite, repeat):
+    """Times every benchmark of suite on every position of corpus, repeat times, with cold caches.
+
+    Returns:
+        {name: {"all": summary, "by_ply": {ply: summary}}}
+    """
+    results = {}
+    for name, (prepare, run) in suite.items():
+        samples = []
+        by_ply = {}
+        for position in corpus:
+            for _ in range(repeat):
+                clear_caches()
+                arguments = prepare(position)
+                start = time.perf_counter()
+                run(*arguments)
+                elapsed = time.perf_counter() - start
+                samples.append(elapsed)
+                by_ply.setdefault(str(position["ply"]), []).append(elapsed)
+        results[name] = {"all": summarize(samples),
+            "by_ply": {ply: summarize(times) for ply, times in by_ply.items()}}
+        print("%-20s median %8.3f ms  p90 %8.3f ms  max %8.3f ms" % (name, results[name]["all"].get("median_ms", 0),
+            results[name]["all"].get("p90_ms", 0), results[name]["all"].get("max_ms", 0)), file=sys.stderr)
+    return results
+
+
+def git_commit():
+    """Returns the current commit of the repository, or None outside of git."""
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Times the solver pipeline on the diagrams and random positions, output as JSON.")
+    parser.add_argument("--seed", type=int, default=1, help="seed of the random positions")
+    parser.add_argument("--positions", type=int, default=5, help="random positions for every ply")
+    parser.add_argument("--plies", type=int, nargs="+", default=list(range(4, 37, 4)), help="plies of the random positions")
+    parser.add_argument("--depths", type=int, nargs="+", default=[2, 3, 4, 5, 6], help="minimax search depths")
+    parser.add_argument("--repeat", type=int, default=3, help="timings of every position")
+    parser.add_argument("--move-time", type=float, default=0.1, help="time budget of play.play in seconds")
+    parser.add_argument("--only", nargs="+", help="names of the benchmarks to run")
+    parser.add_argument("--output", help="file to write the JSON to, standard output by default")
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.seed, args.plies, args.positions)
+    suite = benchmarks(args.depths, args.move_time)
+    if args.only:
+        suite = {name: suite[name] for name in args.only}
+    report = {"meta": {"commit": git_commit(),
+            "python": platform.python_version(),
+            "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "seed": args.seed,
+            "positions_per_ply": args.positions,
+            "plies": args.plies,
+            "repeat": args.repeat,
+            "move_time": args.move_time,
+            "corpus_size": len(corpus)},
+        "results": run_benchmarks(corpus, suite, args.repeat)}
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
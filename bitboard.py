@@ -0,0 +1,311 @@
+import random
+
+# ----------- BITBOARD LAYOUT ----------- #
+# Every column uses 7 bits: 6 for the squares (bottom to top) and 1 sentinel bit
+# on top so that shifts never wrap a group from one column into the next one.
+#
+#   .  .  .  .  .  .  .     <- sentinel row (always empty)
+#   5 12 19 26 33 40 47
+#   4 11 18 25 32 39 46
+#   3 10 17 24 31 38 45
+#   2  9 16 23 30 37 44
+#   1  8 15 22 29 36 43
+#   0  7 14 21 28 35 42     <- row 0 (bottom row, first item of a flipped board)
+
+ROWS = 6
+COLS = 7
+COLUMN_BITS = ROWS + 1
+
+BOTTOM_MASK = sum(1 << (col * COLUMN_BITS) for col in range(COLS))
+BOARD_MASK = BOTTOM_MASK * ((1 << ROWS) - 1)
+COLUMN_MASKS = tuple(((1 << ROWS) - 1) << (col * COLUMN_BITS) for col in range(COLS))
+TOP_MASKS = tuple(1 << (col * COLUMN_BITS + ROWS - 1) for col in range(COLS))
+
+# Zobrist keys: one random 64-bit number per player and bit index, plus one per side to move.
+# The generator is seeded so that hashes are stable between runs and processes.
+_zobrist_random = random.Random(20230401)
+ZOBRIST = {player: [_zobrist_random.getrandbits(64) for _ in range(COLS * COLUMN_BITS)] for player in ("X", "O")}
+ZOBRIST_SIDE = {player: _zobrist_random.getrandbits(64) for player in ("X", "O")}
+
+# ----------- MIRROR IMAGE ----------- #
+# A position and its left-right mirror image have the same value, with mirrored best moves.
+# Caches store a position once, under the smaller of its key and the key of its mirror image.
+
+# Bit index of the mirrored square of every bit index.
+MIRROR_INDEX = [(COLS - 1 - index // COLUMN_BITS) * COLUMN_BITS + index % COLUMN_BITS for index in range(COLS * COLUMN_BITS)]
+
+# Zobrist keys of the mirrored squares, so that the hash of the mirror image is kept along with the hash.
+ZOBRIST_MIRROR = {player: [keys[MIRROR_INDEX[index]] for index in range(COLS * COLUMN_BITS)] for player, keys in ZOBRIST.items()}
+
+
+def mirror_column(col):
+    return COLS - 1 - col
+
+
+def mirror_mask(mask):
+    """Returns the mask of the mirrored squares of mask."""
+    mirrored = 0
+    for col in range(COLS):
+        mirrored |= ((mask >> (col * COLUMN_BITS)) & ((1 << COLUMN_BITS) - 1)) << ((COLS - 1 - col) * COLUMN_BITS)
+    return mirrored
+
+
+def mirror_board(board):
+    """Returns the mirror image of a list-of-lists board."""
+    return [row[::-1] for row in board]
+
+
+def square_bit(row, col):
+    """Returns the bit of a (row, col) square. Row 0 is the bottom row."""
+    return 1 << (col * COLUMN_BITS + row)
+
+
+def bit_square(bit):
+    """Returns the (row, col) square of a single bit."""
+    index = bit.bit_length() - 1
+    return (index % COLUMN_BITS, index // COLUMN_BITS)
+
+
+def has_won(mask):
+    """Returns True if the stones in mask contain four in a row."""
+    # Horizontal
+    m = mask & (mask >> COLUMN_BITS)
+    if m & (m >> (2 * COLUMN_BITS)):
+        return True
+    # Diagonal /
+    m = mask & (mask >> (COLUMN_BITS + 1))
+    if m & (m >> (2 * (COLUMN_BITS + 1))):
+        return True
+    # Diagonal \
+    m = mask & (mask >> (COLUMN_BITS - 1))
+    if m & (m >> (2 * (COLUMN_BITS - 1))):
+        return True
+    # Vertical
+    m = mask & (mask >> 1)
+    if m & (m >> 2):
+        return True
+    return False
+
+
+def winning_squares(mask, occupied):
+    """Returns a mask with all the empty squares that would complete four in a row for the stones in mask."""
+    # Vertical
+    r = (mask << 1) & (mask << 2) & (mask << 3)
+
+    # Horizontal
+    p = (mask << COLUMN_BITS) & (mask << 2 * COLUMN_BITS)
+    r |= p & (mask << 3 * COLUMN_BITS)
+    r |= p & (mask >> COLUMN_BITS)
+    p = (mask >> COLUMN_BITS) & (mask >> 2 * COLUMN_BITS)
+    r |= p & (mask << COLUMN_BITS)
+    r |= p & (mask >> 3 * COLUMN_BITS)
+
+    # Diagonal \
+    p = (mask << (COLUMN_BITS - 1)) & (mask << 2 * (COLUMN_BITS - 1))
+    r |= p & (mask << 3 * (COLUMN_BITS - 1))
+    r |= p & (mask >> (COLUMN_BITS - 1))
+    p = (mask >> (COLUMN_BITS - 1)) & (mask >> 2 * (COLUMN_BITS - 1))
+    r |= p & (mask << (COLUMN_BITS - 1))
+    r |= p & (mask >> 3 * (COLUMN_BITS - 1))
+
+    # Diagonal /
+    p = (mask << (COLUMN_BITS + 1)) & (mask << 2 * (COLUMN_BITS + 1))
+    r |= p & (mask << 3 * (COLUMN_BITS + 1))
+    r |= p & (mask >> (COLUMN_BITS + 1))
+    p = (mask >> (COLUMN_BITS + 1)) & (mask >> 2 * (COLUMN_BITS + 1))
+    r |= p & (mask << (COLUMN_BITS + 1))
+    r |= p & (mask >> 3 * (COLUMN_BITS + 1))
+
+    return r & (BOARD_MASK ^ occupied)
+
+
+def player_mask(board, player):
+    """Returns the bitboard of the stones of player on a flipped list-of-lists board."""
+    mask = 0
+    for row in range(ROWS):
+        cells = board[row]
+        for col in range(COLS):
+            if cells[col] == player:
+                mask |= 1 << (col * COLUMN_BITS + row)
+    return mask
+
+
+def zobrist_hash(board):
+    """Returns the Zobrist hash of the stones on a flipped list-of-lists board."""
+    key = 0
+    for row in range(ROWS):
+        cells = board[row]
+        for col in range(COLS):
+            cell = cells[col]
+            if cell != ".":
+                key ^= ZOBRIST[cell][col * COLUMN_BITS + row]
+    return key
+
+
+def other_player(player):
+    if player == "X":
+        return "O"
+    return "X"
+
+
+# ----------- POSITION ----------- #
+
+class Position:
+    """Compact Connect-Four position: one bitboard per player plus the height of every column.
+
+    Moves are played and undone in place, so a search never needs to copy the board.
+    """
+
+    __slots__ = ("stones", "heights", "occupied", "moves", "hash", "mirror_hash")
+
+    def __init__(self):
+        self.stones = {"X": 0, "O": 0}
+        self.heights = [0] * COLS
+        self.occupied = 0
+        self.moves = 0
+        self.hash = 0 # Zobrist hash of the stones, updated incrementally by play and undo
+        self.mirror_hash = 0 # Zobrist hash of the mirror image
+
+    def copy(self):
+        position = Position()
+        position.stones = dict(self.stones)
+        position.heights = list(self.heights)
+        position.occupied = self.occupied
+        position.moves = self.moves
+        position.hash = self.hash
+        position.mirror_hash = self.mirror_hash
+        return position
+
+    def can_play(self, col):
+        return self.heights[col] < ROWS
+
+    def playable_columns(self):
+        """Returns all the columns that are not full, from left to right."""
+        return [col for col in range(COLS) if self.heights[col] < ROWS]
+
+    def playable_mask(self):
+        """Returns a mask with the directly playable square of every column."""
+        return (self.occupied + BOTTOM_MASK) & BOARD_MASK
+
+    def play(self, col, player):
+        """Drops a stone of player in col."""
+        index = col * COLUMN_BITS + self.heights[col]
+        bit = 1 << index
+        self.stones[player] |= bit
+        self.occupied |= bit
+        self.hash ^= ZOBRIST[player][index]
+        self.mirror_hash ^= ZOBRIST_MIRROR[player][index]
+        self.heights[col] += 1
+        self.moves += 1
+
+    def undo(self, col):
+        """Removes the top stone of col."""
+        self.heights[col] -= 1
+        self.moves -= 1
+        index = col * COLUMN_BITS + self.heights[col]
+        bit = 1 << index
+        self.occupied ^= bit
+        player = "X" if self.stones["X"] & bit else "O"
+        self.stones[player] ^= bit
+        self.hash ^= ZOBRIST[player][index]
+        self.mirror_hash ^= ZOBRIST_MIRROR[player][index]
+
+    def is_full(self):
+        return self.moves == ROWS * COLS
+
+    def has_won(self, player):
+        return has_won(self.stones[player])
+
+    def has_strong_threat(self, player):
+        """Returns True if player has a group with 3 stones whose empty square is directly playable."""
+        return winning_squares(self.stones[player], self.occupied) & self.playable_mask() != 0
+
+    def is_winning_move(self, col, player):
+        """Returns True if playing col completes four in a row for player."""
+        bit = 1 << (col * COLUMN_BITS + self.heights[col])
+        return winning_squares(self.stones[player], self.occupied) & bit != 0
+
+    def key(self):
+        """Returns an integer that uniquely identifies the stones on the board."""
+        return self.stones["X"] + self.occupied + BOTTOM_MASK
+
+    def canonical_key(self):
+        """Returns (key, mirrored): the smaller of key() and the key of the mirror image, and
+        whether it is the key of the mirror image. Columns found for the key have to be mirrored
+        back when mirrored is True."""
+        key = self.key()
+        mirrored_key = mirror_mask(key) # Every column of the key only uses its own 7 bits.
+        if mirrored_key < key:
+            return mirrored_key, True
+        return key, False
+
+
+# ----------- CONVERTERS ----------- #
+
+def from_board(board):
+    """Converts a flipped list-of-lists board (row 0 at the bottom) into a Position."""
+    position = Position()
+    stones = position.stones
+    heights = position.heights
+    occupied = 0
+    key = 0
+    mirror_key = 0
+    for row in range(ROWS):
+        cells = board[row]
+        for col in range(COLS):
+            cell = cells[col]
+            if cell != ".":
+                index = col * COLUMN_BITS + row
+                stones[cell] |= 1 << index
+                occupied |= 1 << index
+                key ^= ZOBRIST[cell][index]
+                mirror_key ^= ZOBRIST_MIRROR[cell][index]
+                heights[col] = row + 1
+    position.occupied = occupied
+    position.hash = key
+    position.mirror_hash = mirror_key
+    position.moves = bin(occupied).count("1")
+    return position
+
+
+def to_board(position):
+    """Converts a Position into a flipped list-of-lists board (row 0 at the bottom)."""
+    x_stones = position.stones["X"]
+    o_stones = position.stones["O"]
+    board = []
+    for row in range(ROWS):
+        cells = []
+        for col in range(COLS):
+            bit = 1 << (col * COLUMN_BITS + row)
+            if x_stones & bit:
+                cells.append("X")
+            elif o_stones & bit:
+                cells.append("O")
+            else:
+                cells.append(".")
+        board.append(cells)
+    return board
+
+
+# ----------- TESTING ----------- #
+
+if __name__ == "__main__":
+    from utils import board_flip
+
+    diagram8_1 = board_flip([
+        [".", ".", ".", ".", ".", ".", "."],
+        [".", ".", ".", ".", ".", ".", "."],
+        [".", ".", ".", "O", "X", ".", "."],
+        [".", "X", "X", "X", "O", ".", "."],
+        [".", "X", "O", "O", "O", ".", "."],
+        ["X", "O", "X", "X", "O", ".", "."]])
+
+    position = from_board(diagram8_1)
+    print("Heights:", position.heights)
+    print("Round trip:", to_board(position) == diagram8_1)
+    print("Playable columns:", position.playable_columns())
+    print("X wins in:", [col for col in position.playable_columns() if position.is_winning_move(col, "X")])
+    print("O wins in:", [col for col in position.playable_columns() if position.is_winning_move(col, "O")])
+    mirrored = from_board(mirror_board(diagram8_1))
+    print("Mirror hash:", mirrored.hash == position.mirror_hash and mirrored.mirror_hash == position.hash)
+    print("Canonical key:", position.canonical_key()[0] == mirrored.canonical_key()[0])
@@ -0,0 +1,155 @@
+import argparse
+import mmap
+import os
+import struct
+import time
+
+from bitboard import COLS, ROWS, mirror_column, other_player, to_board
+from cache import board_key, position_key
+from groups import CountedPosition
+from minimax import search
+from transposition import TranspositionTable
+
+# ----------- OPENING BOOK FILE ----------- #
+# Header: magic, version and number of records.
+# Records: position key (uint64), best column (uint8) and score (int8), sorted by key,
+# so that a lookup is a binary search on the memory-mapped file without loading it.
+# A position and its mirror image share one record, stored under the canonical key with the
+# column of that side.
+
+MAGIC = b"C4BK"
+VERSION = 2
+HEADER = struct.Struct("<4sHxxI")
+RECORD = struct.Struct("<QBb")
+
+BOOK_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "opening_book.bin")
+
+
+class OpeningBook:
+    """Read-only view of an opening book file."""
+
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.count = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError("not an opening book file:", path)
+
+    def __len__(self):
+        return self.count
+
+    def key_at(self, index):
+        return RECORD.unpack_from(self.data, HEADER.size + index * RECORD.size)[0]
+
+    def lookup(self, key):
+        """Returns (column, score) stored for key, or None."""
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self.key_at(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.count:
+            found, column, score = RECORD.unpack_from(self.data, HEADER.size + low * RECORD.size)
+            if found == key:
+                return column, score
+        return None
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+
+def write_book(path, entries):
+    """Writes a book file from a dictionary {key: (column, score)}."""
+    with open(path, "wb") as book_file:
+        book_file.write(HEADER.pack(MAGIC, VERSION, len(entries)))
+        for key in sorted(entries):
+            column, score = entries[key]
+            book_file.write(RECORD.pack(key, column, score))
+
+
+# ----------- LOOKUP FROM PLAY ----------- #
+
+_book = None
+_book_checked = False
+
+
+def get_book(path=BOOK_PATH):
+    """Returns the default opening book, or None if there is no book file."""
+    global _book, _book_checked
+    if not _book_checked:
+        _book_checked = True
+        if os.path.exists(path):
+            _book = OpeningBook(path)
+    return _book
+
+
+def probe(board, player):
+    """Returns the book column for a flipped board with player to move, or None."""
+    book = get_book()
+    if book is None:
+        return None
+    key, mirrored = board_key(board, player)
+    entry = book.lookup(key)
+    if entry is None:
+        return None
+    if mirrored:
+        return mirror_column(entry[0])
+    return entry[0]
+
+
+# ----------- BOOK BUILDER ----------- #
+
+def book_positions(plies, first_player="X"):
+    """Returns all positions reachable in at most plies moves without a win, as {key: (position, player)}.
+    A position and its mirror image are kept once, under their common key."""
+    positions = {}
+    frontier = [(CountedPosition(), first_player)]
+    for ply in range(plies + 1):
+        next_frontier = []
+        for position, player in frontier:
+            key, _ = position_key(position, player)
+            if key in positions:
+                continue
+            positions[key] = (position, player)
+            if ply == plies:
+                continue
+            for col in range(COLS):
+                if position.heights[col] < ROWS and not position.is_winning_move(col, player):
+                    child = position.copy()
+                    child.play(col, player)
+                    next_frontier.append((child, other_player(player)))
+        frontier = next_frontier
+    return positions
+
+
+def build_book(path, plies, depth, first_player="X"):
+    """Searches every position of the first plies moves to depth and writes the book to path."""
+    table = TranspositionTable(1 << 20)
+    entries = {}
+    positions = book_positions(plies, first_player)
+    start = time.time()
+    for i, (key, (position, player)) in enumerate(positions.items()):
+        column, score, _ = search(to_board(position), player, depth, table)
+        if column is not None:
+            if position_key(position, player)[1]: # The record holds the column of the mirror image.
+                column = mirror_column(column)
+            entries[key] = (column, score)
+        if (i + 1) % 100 == 0:
+            print("%d/%d positions, %.0fs" % (i + 1, len(positions), time.time() - start))
+    write_book(path, entries)
+    return len(entries)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Builds the opening book consulted by play.play.")
+    parser.add_argument("--plies", type=int, default=4, help="book all positions up to this many moves")
+    parser.add_argument("--depth", type=int, default=8, help="search depth used for every position")
+    parser.add_argument("--first-player", default="X", choices=["X", "O"])
+    parser.add_argument("--output", default=BOOK_PATH)
+    args = parser.parse_args()
+    count = build_book(args.output, args.plies, args.depth, args.first_player)
+    print("Wrote %d positions to %s" % (count, args.output))
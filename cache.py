@@ -0,0 +1,80 @@
+from collections import OrderedDict
+
+from bitboard import from_board
+
+# ----------- LRU CACHE ----------- #
+
+DEFAULT_SIZE = 1 << 12
+
+
+def position_key(position, player):
+    """Returns (key, mirrored) for a Position with player to move.
+
+    key: the canonical position key and one bit for the player. A position and its mirror
+        image have the same key.
+    mirrored: True if key is the key of the mirror image, in which case results stored for key
+        have to be mirrored back for position.
+    """
+    key, mirrored = position.canonical_key()
+    return key << 1 | (player == "O"), mirrored
+
+
+def board_key(board, player):
+    """Returns position_key for a flipped board with player to move."""
+    return position_key(from_board(board), player)
+
+
+class LRUCache:
+    """Dictionary of at most maxsize entries that drops the least recently used entry when full."""
+
+    def __init__(self, maxsize=DEFAULT_SIZE):
+        if maxsize <= 0:
+            raise ValueError("maxsize must be positive:", maxsize)
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def get(self, key, default=None):
+        """Returns the value stored for key, or default, and marks the entry as recently used."""
+        try:
+            value = self.entries[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self.entries.clear()
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def stats(self):
+        """Returns the counters used to size the cache."""
+        lookups = self.hits + self.misses
+        return {"size": self.maxsize,
+            "filled": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0}
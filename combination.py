@@ -1,4 +1,59 @@
+from enum import IntEnum
 from utils import *
+from bitboard import BOARD_MASK, COLUMN_MASKS, ROWS, square_bit
+from groups import GROUP_IDS
+from rules import squares_masks
+
+
+# ------- SOLUTION ENCODING --------
+
+class Rule(IntEnum):
+    ODD_THREAT = 0
+    THREAT_COMBINATION = 1
+    CLAIMEVEN = 2
+    BASEINVERSE = 3
+    VERTICAL = 4
+    BEFORE = 5
+    AFTEREVEN = 6
+    LOWINVERSE = 7
+    HIGHINVERSE = 8
+    BASECLAIM = 9
+    SPECIALBEFORE = 10
+
+def encode_solution(solution, masks=None):
+    """Adds the bitset encoding of a Solution to it and returns it.
+    masks: optional (squares_mask, columns_mask) of the squares, as kept by rules.rule_table.
+    Added keys:
+        rule_id (Rule): the rule as an int enum.
+        squares_mask: bitboard of the squares.
+        columns_mask: bitboard of all the squares in the columns of the squares.
+        claimeven_lower_mask: bitboard of the lower squares of the Claimevens used by the Solution.
+        groups_mask: bit group_id set for every solved group.
+    """
+    if masks is None:
+        masks = squares_masks(solution["squares"])
+    squares_mask, columns_mask = masks
+    claimeven_lower_mask = 0
+    if solution["rule"] == "claimeven":
+        claimeven_lower_mask = square_bit(*solution["squares"][1])
+    for _, lower in solution.get("claimevens", []):
+        claimeven_lower_mask |= square_bit(*lower)
+    groups_mask = 0
+    for group in solution["groups"]:
+        if group in GROUP_IDS:
+            groups_mask |= 1 << GROUP_IDS[group]
+    solution["rule_id"] = Rule[solution["rule"].upper()]
+    solution["squares_mask"] = squares_mask
+    solution["columns_mask"] = columns_mask
+    solution["claimeven_lower_mask"] = claimeven_lower_mask
+    solution["groups_mask"] = groups_mask
+    return solution
+
+def fill_down(mask):
+    """Returns mask with all the squares below its squares, in the same column, added."""
+    for _ in range(ROWS - 1):
+        mask |= (mask >> 1) & BOARD_MASK
+    return mask
 
 
 # ------- THE 4 RULES --------
@@ -11,7 +66,7 @@ def disjoint(s1, s2) -> bool:
     Returns:
         True if the sets of squares are disjoint. Otherwise, False
     """
-    return set(s1["squares"]).isdisjoint(s2["squares"])
+    return not s1["squares_mask"] & s2["squares_mask"]
 
 def no_claimeven_below_or_at_inverse(inverse_solution, claimeven_solution):
     """Returns True if there is no Claimeven in claimeven_solution below or at the Inverse of inverse_solution.
@@ -23,23 +78,18 @@ def no_claimeven_below_or_at_inverse(inverse_solution, claimeven_solution):
             above a square in inverse_solution.
         Otherwise, True.
     """
-    #
-    for i_square in inverse_solution["squares"]:
-        for c_square in claimeven_solution["squares"][1]: # Lower Claimeven squares.
-            # If the inverse has a square above or equal to the bottom square of a Claimeven in other:
-            if i_square[1] == c_square[1] and i_square[0] <= c_square[0]:
-                return False
-    return True
+    return not inverse_solution["squares_mask"] & fill_down(claimeven_solution["claimeven_lower_mask"])
 
 def column_wise_disjoint_or_equal(s1, s2):
-    s1_square_by_column = cols_to_squares(s1)
-    s2_square_by_column = cols_to_squares(s2)
-    for col in s1_square_by_column:
-        if col in s2_square_by_column:
-            # If the two sets of Squares are not equal but share a Square:
-            if (s1_square_by_column[col].intersection(s2_square_by_column[col]) and
-                    s1_square_by_column[col] != s2_square_by_column[col]):
-                return False
+    """Returns True if, in every column, the squares of both Solutions are either disjoint or equal."""
+    shared = s1["squares_mask"] & s2["squares_mask"]
+    if not shared:
+        return True
+    different = s1["squares_mask"] ^ s2["squares_mask"]
+    for column_mask in COLUMN_MASKS:
+        # If the two sets of Squares are not equal but share a Square:
+        if shared & column_mask and different & column_mask:
+            return False
     return True
 
 def combination_allowed(s1, s2):
@@ -52,41 +102,20 @@ def combination_allowed(s1, s2):
     Returns
         True if the combination is allowed, False otherwise.
     """
-    # If either Solution is an Oddthreat or ThreatCombination.
-    if s1["rule"] == "odd_threat" or s1["rule"] == "threat_combination":
-        return allowed_with_odd_threat_or_threat_combination(s1, s2)
-    if s2["rule"] == "odd_threat" or s2["rule"] == "threat_combination":
-        return allowed_with_odd_threat_or_threat_combination(s2, s1)
-
-    # If either Solution is a Claimeven.
-    if s1["rule"] == "claimeven":
-        return allowed_with_claimeven(s1, s2)
-    if s2["rule"] == "claimeven":
-        return allowed_with_claimeven(s2, s1)
-
-    # If either Solution is a Baseinverse:
-    if s1["rule"] == "baseinverse":
-        return allowed_with_baseinverse(s1, s2)
-    if s2["rule"] == "baseinverse":
-        return allowed_with_baseinverse(s2, s1)
-
-    # If either Solution is a Vertical:
-    if s1["rule"] == "vertical":
-        return allowed_with_vertical(s1, s2)
-    if s2["rule"] == "vertical":
-        return allowed_with_vertical(s2, s1)
-
-    # If either Solution is a Before:
-    if s1["rule"] == "before":
-        return allowed_with_vertical(s1, s2)
-    if s2["rule"] == "before":
-        return allowed_with_vertical(s2, s1)
+    check, swap = COMBINATION_TABLE[s1["rule_id"]][s2["rule_id"]]
+    if check is None:
+        return None
+    if swap:
+        return check(s2, s1)
+    return check(s1, s2)
     
 
+CLAIMEVEN_DISJOINT_RULES = {Rule.CLAIMEVEN, Rule.BASEINVERSE, Rule.VERTICAL, Rule.AFTEREVEN, Rule.BASECLAIM, Rule.BEFORE, Rule.SPECIALBEFORE}
+
 def allowed_with_claimeven(s1, s2):
-    if s2["rule"] in ["claimeven", "baseinverse", "vertical", "aftereven", "baseclaim", "before", "specialbefore"]:
+    if s2["rule_id"] in CLAIMEVEN_DISJOINT_RULES:
         return disjoint(s1, s2)
-    if s2["rule"] in ["lowinverse", "highinverse"]:
+    if s2["rule_id"] in (Rule.LOWINVERSE, Rule.HIGHINVERSE):
         return no_claimeven_below_or_at_inverse(inverse_solution=s2, claimeven_solution=s1)
     raise ValueError("invalid other.rule_instance for allowed_with_claimeven:", s2["rule"])
 
@@ -112,6 +141,30 @@ def allowed_with_odd_threat_or_threat_combination(s1, s2):
     """
 
 
+# ------- DISPATCH TABLE --------
+
+# The check used for a pair of rules is the one of the first rule of this list that either
+# Solution has; the Solution with that rule is passed first.
+CHECK_PRIORITY = [
+    ({Rule.ODD_THREAT, Rule.THREAT_COMBINATION}, allowed_with_odd_threat_or_threat_combination),
+    ({Rule.CLAIMEVEN}, allowed_with_claimeven),
+    ({Rule.BASEINVERSE}, allowed_with_baseinverse),
+    ({Rule.VERTICAL}, allowed_with_vertical),
+    ({Rule.BEFORE}, allowed_with_vertical),
+]
+
+def find_check(rule1, rule2):
+    """Returns (check, swap) for a pair of rules. check is None if no check applies to them."""
+    for rules, check in CHECK_PRIORITY:
+        if rule1 in rules:
+            return check, False
+        if rule2 in rules:
+            return check, True
+    return None, False
+
+COMBINATION_TABLE = [[find_check(rule1, rule2) for rule2 in Rule] for rule1 in Rule]
+
+
 
 
 
@@ -122,4 +175,4 @@ if __name__ == "__main__":
 
     s1 = {'squares': [(1, 5), (4, 2), (4, 2), (3, 2), (1, 5), (0, 5)], 'groups': {((2, 5), (3, 4), (4, 3), (5, 2))}, 'rule': 'before'}
     s2 = {'squares': ((5, 5), (4, 5)), 'groups': [((2, 5), (3, 5), (4, 5), (5, 5)), ((5, 2), (5, 3), (5, 4), (5, 5)), ((5, 3), (5, 4), (5, 5), (5, 6))], 'rule': 'claimeven'}
-    print(combination_allowed(s1, s2))
+    print(combination_allowed(encode_solution(s1), encode_solution(s2)))
@@ -0,0 +1,193 @@
+# ----------- COVER SOLVER ----------- #
+# Algorithm X on dancing links, adapted to what victor needs:
+#   - Every Problem has to be solved at least once: choosing a Solution removes the Problems it
+#     solves, but leaves the other Solutions of those Problems in place.
+#   - Two Solutions that cannot be combined are never chosen together: choosing a Solution
+#     removes all Solutions it conflicts with from the Problems they still could solve.
+# Every removal unlinks nodes that keep their own links, so it is undone in O(1) per node by
+# relinking them in the reverse order. The number of candidates of every Problem is kept up
+# to date, so the next Problem to branch on (the one with the fewest candidates) is found
+# without recounting.
+
+
+class NodeLimit(Exception):
+    """Raised when the solver explored more nodes than it was allowed to."""
+
+
+class DancingLinks:
+    """Problem x Solution incidence structure.
+
+    Nodes are stored in flat lists. Node 0 is the root, nodes 1..num_problems are the headers
+    of the Problems and the next nodes are the (Problem, Solution) incidences.
+
+    Args:
+        num_problems: number of Problems, identified by 0..num_problems-1.
+        rows: for every Solution, the Problems it solves.
+        conflicts: for every Solution, the Solutions it cannot be combined with. A Solution
+            listed in its own conflicts, as in victor's node graph, is ignored there.
+    """
+
+    def __init__(self, num_problems, rows, conflicts):
+        headers = num_problems + 1
+        self.left = [i - 1 for i in range(headers)]
+        self.right = [i + 1 for i in range(headers)]
+        self.left[0] = num_problems
+        self.right[num_problems] = 0
+        self.up = list(range(headers))
+        self.down = list(range(headers))
+        self.column = list(range(headers))
+        self.row = [-1] * headers
+        self.size = [0] * headers
+        self.active = [True] * headers
+        self.row_nodes = []
+        self.conflicts = [[other for other in others if other != r] for r, others in enumerate(conflicts)]
+        self.removed = [0] * len(rows) # Number of reasons a Solution is unlinked for.
+        self.nodes = 0
+        self.backtracks = 0
+
+        for r, problems in enumerate(rows):
+            nodes = []
+            for problem in dict.fromkeys(problems):
+                c = problem + 1
+                node = len(self.column)
+                self.column.append(c)
+                self.row.append(r)
+                self.up.append(self.up[c])
+                self.down.append(c)
+                self.down[self.up[c]] = node
+                self.up[c] = node
+                self.size[c] += 1
+                nodes.append(node)
+            self.row_nodes.append(nodes)
+
+    # ----------- LINK OPERATIONS ----------- #
+
+    def exclude(self, r):
+        """Removes Solution r from the candidates of its Problems."""
+        self.removed[r] += 1
+        if self.removed[r] == 1:
+            up, down, size, column = self.up, self.down, self.size, self.column
+            for node in self.row_nodes[r]:
+                up[down[node]] = up[node]
+                down[up[node]] = down[node]
+                size[column[node]] -= 1
+
+    def include(self, r):
+        """Undoes the last exclude(r)."""
+        if self.removed[r] == 1:
+            up, down, size, column = self.up, self.down, self.size, self.column
+            for node in reversed(self.row_nodes[r]):
+                size[column[node]] += 1
+                up[down[node]] = node
+                down[up[node]] = node
+        self.removed[r] -= 1
+
+    def choose(self, r):
+        """Chooses Solution r. Returns the Problems it solved, to be given back to unchoose."""
+        solved = []
+        for node in self.row_nodes[r]:
+            c = self.column[node]
+            if self.active[c]:
+                self.active[c] = False
+                self.right[self.left[c]] = self.right[c]
+                self.left[self.right[c]] = self.left[c]
+                solved.append(c)
+        for other in self.conflicts[r]:
+            self.exclude(other)
+        return solved
+
+    def unchoose(self, r, solved):
+        for other in reversed(self.conflicts[r]):
+            self.include(other)
+        for c in reversed(solved):
+            self.right[self.left[c]] = c
+            self.left[self.right[c]] = c
+            self.active[c] = True
+
+    # ----------- SEARCH ----------- #
+
+    def most_difficult_problem(self):
+        """Returns the header of the unsolved Problem with the fewest candidates, or 0 if all are solved."""
+        best = 0
+        best_size = None
+        c = self.right[0]
+        while c != 0:
+            if best_size is None or self.size[c] < best_size:
+                best = c
+                best_size = self.size[c]
+                if best_size <= 1:
+                    break
+            c = self.right[c]
+        return best
+
+    def search(self, chosen, max_nodes=None):
+        """Depth-first search for a set of Solutions solving every Problem, appended to chosen.
+
+        Returns:
+            True if such a set was found, False otherwise. On success the structure is left as
+            it is at the leaf, so a DancingLinks is solved only once.
+
+        Raises:
+            NodeLimit: if more than max_nodes nodes were explored.
+        """
+        self.nodes += 1
+        if max_nodes is not None and self.nodes > max_nodes:
+            raise NodeLimit()
+        c = self.most_difficult_problem()
+        if c == 0:
+            return True
+
+        # Once every set containing a Solution has been tried, leave it out of the next branches.
+        tried = []
+        node = self.down[c]
+        while node != c:
+            r = self.row[node]
+            solved = self.choose(r)
+            chosen.append(r)
+            if self.search(chosen, max_nodes):
+                return True
+            chosen.pop()
+            self.unchoose(r, solved)
+            self.backtracks += 1
+            self.exclude(r)
+            tried.append(r)
+            node = self.down[node]
+        for r in reversed(tried):
+            self.include(r)
+        return False
+
+
+def find_cover(num_problems, rows, conflicts, stats=None, max_nodes=None):
+    """Finds a set of Solutions that solves every Problem, without two conflicting Solutions.
+
+    Args:
+        num_problems: number of Problems, identified by 0..num_problems-1.
+        rows: for every Solution, the Problems it solves.
+        conflicts: for every Solution, the Solutions it cannot be combined with.
+        stats: optional dictionary, filled with the nodes explored and backtracks.
+        max_nodes: optional limit on the nodes explored. Reaching it counts as no set found.
+    Returns:
+        List with the indices of the chosen Solutions, or None if there is no such set.
+    """
+    links = DancingLinks(num_problems, rows, conflicts)
+    chosen = []
+    try:
+        found = links.search(chosen, max_nodes)
+    except NodeLimit:
+        found = False
+    if stats is not None:
+        stats["cover_nodes"] = links.nodes
+        stats["cover_backtracks"] = links.backtracks
+    return chosen if found else None
+
+
+# ----------- TESTING ----------- #
+
+if __name__ == "__main__":
+    # Problems 0..3. Solution 0 solves everything but conflicts with 3, 1 and 2 conflict.
+    rows = [[0, 1, 2, 3], [0, 1], [2, 3], [1, 2], [0], [3]]
+    conflicts = [[3], [2], [1], [0], [], []]
+    stats = {}
+    print("Cover:", find_cover(4, rows, conflicts, stats))
+    print("Stats:", stats)
+    print("No cover:", find_cover(2, [[0], [1]], [[1], [0]]))
@@ -4,11 +4,15 @@ import pprint
 import json
 import random
 import time
+import os
 from copy import copy, deepcopy
-from play import play
+from play import play, transposition_table
+from ponder import Ponderer
 from functools import reduce
 
 STUDENT_TOKEN = "VICTORIANOS"
+# Base URL of the game server, e.g. a local stand-in server for testing.
+BASE_URL = os.environ.get("CONNECT4_SERVER", "https://emarchiori.eu.pythonanywhere.com")
 
 class Game:
   def __init__(self, state, status, player):
@@ -36,33 +40,35 @@ class Game:
 
 def new_game(game_type, multi_player = False):
   for _ in range(10):
-    r = requests.get('https://emarchiori.eu.pythonanywhere.com/new-game?TOKEN=%s&game-type=%s&multi-player=%s' % (STUDENT_TOKEN, game_type, 'True' if multi_player else 'False'))
+    r = requests.get('%s/new-game?TOKEN=%s&game-type=%s&multi-player=%s' % (BASE_URL, STUDENT_TOKEN, game_type, 'True' if multi_player else 'False'))
     if r.status_code == 200:
       return r.json()['game-id']
     print(r.content)
 
 def join_game(game_type, game_id):
   for _ in range(10):
-    r = requests.get('https://emarchiori.eu.pythonanywhere.com/join-game?TOKEN=%s&game-type=%s&game-id=%s' % (STUDENT_TOKEN, game_type, game_id))
+    r = requests.get('%s/join-game?TOKEN=%s&game-type=%s&game-id=%s' % (BASE_URL, STUDENT_TOKEN, game_type, game_id))
     if r.status_code == 200:
       return r.json()['player']
     print(r.content)
 
 def game_state(game_type, game_id, GameClass):
   for _ in range(10):
-    r = requests.get('https://emarchiori.eu.pythonanywhere.com/game-state?TOKEN=%s&game-type=%s&game-id=%s' % (STUDENT_TOKEN, game_type, game_id))
+    r = requests.get('%s/game-state?TOKEN=%s&game-type=%s&game-id=%s' % (BASE_URL, STUDENT_TOKEN, game_type, game_id))
     if r.status_code == 200:
       return GameClass(r.json()['state'], r.json()['status'], r.json()['player'])
     print(r.content)
 
 def update_game(game_type, game_id, player, move):
   for _ in range(10):
-    r = requests.get('https://emarchiori.eu.pythonanywhere.com/update-game?TOKEN=%s&game-type=%s&game-id=%s&player=%s&move=%s' % (STUDENT_TOKEN, game_type, game_id, player, move))
+    r = requests.get('%s/update-game?TOKEN=%s&game-type=%s&game-id=%s&player=%s&move=%s' % (BASE_URL, STUDENT_TOKEN, game_type, game_id, player, move))
     if r.status_code == 200:
       return r.content
     print(r.content)
 
-def game_loop(solver, GameClass, game_type, multi_player = False, id = None):
+def game_loop(solver, GameClass, game_type, multi_player = False, id = None, ponder = False):
+  # ponder: search the replies of the opponent while waiting for its move
+  ponderer = Ponderer(transposition_table) if ponder else None
   while id == None:
     print('Creating new game...')
     id = new_game(game_type, multi_player)
@@ -88,6 +94,8 @@ def game_loop(solver, GameClass, game_type, multi_player = False, id = None):
     
     game.print_game()
     if game.is_end():
+      if ponderer is not None:
+        ponderer.stop()
       if game.player == '-':
         print('draw')
       else:
@@ -98,12 +106,14 @@ def game_loop(solver, GameClass, game_type, multi_player = False, id = None):
       #print("new board")
       #print(new_board)
       print('Making next move...')
-      next_move = play(previous_board, new_board, player)
+      next_move = solver(previous_board, new_board, player, ponderer=ponderer)
       #print("previous board: ", previous_board)      
       #print('Next move: %s' % next_move)
       #print("new board: ", new_board)
       update_result = update_game(game_type, id, player, json.dumps(next_move))
     else:
+      if ponderer is not None:
+        ponderer.start(game.get_board(), player)
       time.sleep(2)
 
 
@@ -126,4 +136,5 @@ class ConnectFour(Game):
     print(self.state)
 
 
-game_loop(play, ConnectFour, 'connect4big', multi_player=False, id=None)
\ No newline at end of file
+if __name__ == "__main__":
+  game_loop(play, ConnectFour, 'connect4big', multi_player=False, id=None, ponder=True)
\ No newline at end of file
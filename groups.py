@@ -0,0 +1,168 @@
+from bitboard import ROWS, COLS, COLUMN_BITS, BOARD_MASK, Position, from_board, square_bit
+
+# ----------- GROUP INDEX ----------- #
+# All 69 groups (four squares in a row) of a 6x7 board, built once when the module is imported.
+# Groups are listed in the order find_threats has always returned them: vertical, horizontal,
+# diagonal right and diagonal left, each with its squares from the lowest one up.
+
+def build_groups():
+    """Returns a list of (direction, squares) for every group on the board."""
+    groups = []
+    for i in range(ROWS - 3):
+        for j in range(COLS):
+            groups.append(("vertical", ((i, j), (i+1, j), (i+2, j), (i+3, j))))
+    for i in range(ROWS):
+        for j in range(COLS - 3):
+            groups.append(("horizontal", ((i, j), (i, j+1), (i, j+2), (i, j+3))))
+    for i in range(ROWS - 3):
+        for j in range(COLS - 3):
+            groups.append(("diagonal_right", ((i, j), (i+1, j+1), (i+2, j+2), (i+3, j+3))))
+    for i in range(ROWS - 3):
+        for j in range(3, COLS):
+            groups.append(("diagonal_left", ((i, j), (i+1, j-1), (i+2, j-2), (i+3, j-3))))
+    return groups
+
+GROUP_DIRECTIONS = tuple(direction for direction, _ in build_groups())
+GROUPS = tuple(squares for _, squares in build_groups())
+GROUP_MASKS = tuple(sum(square_bit(row, col) for row, col in group) for group in GROUPS)
+GROUP_IDS = {group: group_id for group_id, group in enumerate(GROUPS)}
+
+# Every square (row, col) with the ids of the groups that contain it, in ascending order.
+SQUARE_TO_GROUP_IDS = {(row, col): tuple(group_id for group_id, group in enumerate(GROUPS) if (row, col) in group)
+    for row in range(ROWS) for col in range(COLS)}
+
+# Id of the mirror image of every group.
+MIRROR_GROUP_IDS = tuple(GROUP_IDS[min(mirrored, mirrored[::-1])]
+    for mirrored in (tuple((row, COLS - 1 - col) for row, col in group) for group in GROUPS))
+
+TOP_ROW_MASK = sum(square_bit(ROWS - 1, col) for col in range(COLS))
+
+
+def alive_group_ids(opponent_stones):
+    """Returns the ids of all groups that still can be completed, i.e. without any stone of the opponent."""
+    return [group_id for group_id, mask in enumerate(GROUP_MASKS) if not mask & opponent_stones]
+
+
+def completed_group_ids(stones):
+    """Returns the ids of all groups fully occupied by stones."""
+    return [group_id for group_id, mask in enumerate(GROUP_MASKS) if mask & stones == mask]
+
+# Ids of the groups through every bit of the bitboard layout (empty for the sentinel bits).
+BIT_TO_GROUP_IDS = [()] * (COLS * COLUMN_BITS)
+for (row, col), group_ids in SQUARE_TO_GROUP_IDS.items():
+    BIT_TO_GROUP_IDS[col * COLUMN_BITS + row] = group_ids
+
+
+# ----------- POSITION WITH GROUP COUNTERS ----------- #
+
+class CountedPosition(Position):
+    """Position that also keeps, for every group, how many stones each player has in it.
+
+    The counters are updated on play and undo for the groups through the square only,
+    so wins and strong threats are known without rescanning the board:
+        fours[player]: number of groups completed by player.
+        threes[player]: ids of the groups with 3 stones of player and none of the opponent.
+    """
+
+    __slots__ = ("counts", "threes", "fours")
+
+    def __init__(self):
+        Position.__init__(self)
+        self.counts = {"X": [0] * len(GROUPS), "O": [0] * len(GROUPS)}
+        self.threes = {"X": set(), "O": set()}
+        self.fours = {"X": 0, "O": 0}
+
+    def copy(self):
+        position = CountedPosition()
+        position.stones = dict(self.stones)
+        position.heights = list(self.heights)
+        position.occupied = self.occupied
+        position.moves = self.moves
+        position.hash = self.hash
+        position.mirror_hash = self.mirror_hash
+        position.counts = {player: list(counts) for player, counts in self.counts.items()}
+        position.threes = {player: set(threes) for player, threes in self.threes.items()}
+        position.fours = dict(self.fours)
+        return position
+
+    def play(self, col, player):
+        Position.play(self, col, player)
+        opponent = "O" if player == "X" else "X"
+        mine = self.counts[player]
+        theirs = self.counts[opponent]
+        for group_id in BIT_TO_GROUP_IDS[col * COLUMN_BITS + self.heights[col] - 1]:
+            count = mine[group_id] + 1
+            mine[group_id] = count
+            other = theirs[group_id]
+            if other == 0:
+                if count == 3:
+                    self.threes[player].add(group_id)
+                elif count == 4:
+                    self.threes[player].discard(group_id)
+                    self.fours[player] += 1
+            elif other == 3 and count == 1:
+                self.threes[opponent].discard(group_id)
+
+    def undo(self, col):
+        index = col * COLUMN_BITS + self.heights[col] - 1
+        player = "X" if self.stones["X"] >> index & 1 else "O"
+        opponent = "O" if player == "X" else "X"
+        mine = self.counts[player]
+        theirs = self.counts[opponent]
+        for group_id in BIT_TO_GROUP_IDS[index]:
+            count = mine[group_id]
+            mine[group_id] = count - 1
+            other = theirs[group_id]
+            if other == 0:
+                if count == 4:
+                    self.fours[player] -= 1
+                    self.threes[player].add(group_id)
+                elif count == 3:
+                    self.threes[player].discard(group_id)
+            elif other == 3 and count == 1:
+                self.threes[opponent].add(group_id)
+        Position.undo(self, col)
+
+    def has_won(self, player):
+        return self.fours[player] > 0
+
+    def has_strong_threat(self, player):
+        empty = BOARD_MASK ^ self.occupied
+        playable = self.playable_mask()
+        for group_id in self.threes[player]:
+            if GROUP_MASKS[group_id] & empty & playable:
+                return True
+        return False
+
+    def is_winning_move(self, col, player):
+        opponent = "O" if player == "X" else "X"
+        mine = self.counts[player]
+        theirs = self.counts[opponent]
+        for group_id in BIT_TO_GROUP_IDS[col * COLUMN_BITS + self.heights[col]]:
+            if mine[group_id] == 3 and theirs[group_id] == 0:
+                return True
+        return False
+
+
+def counted_position(board):
+    """Converts a flipped list-of-lists board into a CountedPosition."""
+    position = CountedPosition()
+    plain = from_board(board)
+    position.stones = plain.stones
+    position.heights = plain.heights
+    position.occupied = plain.occupied
+    position.moves = plain.moves
+    position.hash = plain.hash
+    position.mirror_hash = plain.mirror_hash
+    for player, opponent in (("X", "O"), ("O", "X")):
+        mine = position.stones[player]
+        theirs = position.stones[opponent]
+        counts = position.counts[player]
+        for group_id, mask in enumerate(GROUP_MASKS):
+            count = bin(mask & mine).count("1")
+            counts[group_id] = count
+            if count == 4:
+                position.fours[player] += 1
+            elif count == 3 and not mask & theirs:
+                position.threes[player].add(group_id)
+    return position
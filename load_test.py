@@ -0,0 +1,110 @@
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import game
+from benchmark import percentile, summarize
+from local_server import LocalServer
+from play import MOVE_TIME, play
+from tournament import CONFIGS
+
+# ----------- LOAD TEST ----------- #
+# Runs concurrent game.game_loop clients, one per worker process, against the local server and
+# reports how long the engine thought per move, how long every move took on the server clock
+# (from the moment the move could be seen to the update) and how many requests the clients made
+# per move.
+
+
+def client(base_url, game_type, time_budget, ponder):
+    """Plays one game with game.game_loop in a worker, with its prints suppressed.
+
+    Returns:
+        The think times of the moves in seconds.
+    """
+    game.BASE_URL = base_url
+    think_times = []
+
+    def solver(previous_board, board, player, **options):
+        start = time.perf_counter()
+        column = play(previous_board, board, player, time_budget=time_budget, **options)
+        think_times.append(time.perf_counter() - start)
+        return column
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        game.game_loop(solver, game.ConnectFour, game_type, ponder=ponder)
+    return think_times
+
+
+def count_summary(counts):
+    """Returns the statistics of a list of counts."""
+    counts = sorted(counts)
+    if not counts:
+        return {"count": 0}
+    return {"count": len(counts),
+        "mean": sum(counts) / len(counts),
+        "median": percentile(counts, 0.5),
+        "p95": percentile(counts, 0.95),
+        "p99": percentile(counts, 0.99),
+        "max": counts[-1]}
+
+
+def load_test(clients, game_type="connect4big", time_budget=MOVE_TIME, ponder=False, workers=None, **server_options):
+    """Plays clients concurrent games against a local server started for the test.
+
+    server_options: arguments of LocalServer (latency, jitter, opponent, opponent_time, first, seed).
+    Returns:
+        Report with the think time and server clock latency statistics of the moves, the
+        requests per move and the requests by endpoint.
+    """
+    server = LocalServer(**server_options).start()
+    start = time.perf_counter()
+    try:
+        # Spawned workers, as forking copies the threads of the server.
+        with ProcessPoolExecutor(max_workers=workers or clients, mp_context=multiprocessing.get_context("spawn")) as pool:
+            futures = [pool.submit(client, server.url, game_type, time_budget, ponder) for _ in range(clients)]
+            think_times = [seconds for future in futures for seconds in future.result()]
+    finally:
+        server.stop()
+    elapsed = time.perf_counter() - start
+
+    stats = server.stats()
+    return {"clients": clients,
+        "seconds": elapsed,
+        "moves": len(stats["moves"]),
+        "think_time": summarize(think_times),
+        "move_latency": summarize([move["latency"] for move in stats["moves"]]),
+        "requests_per_move": count_summary([move["requests"] for move in stats["moves"]]),
+        "requests": sum(stats["endpoints"].values()),
+        "endpoints": stats["endpoints"]}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load-tests game.py clients against a local stand-in of the game server.")
+    parser.add_argument("--clients", type=int, default=4, help="concurrent games")
+    parser.add_argument("--workers", type=int, help="client processes, one per game by default")
+    parser.add_argument("--game-type", default="connect4big")
+    parser.add_argument("--move-time", type=float, default=MOVE_TIME, help="seconds of thinking per move")
+    parser.add_argument("--ponder", action="store_true", help="ponder while the server's player thinks")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds every answer is delayed")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra random delay of up to this many seconds")
+    parser.add_argument("--opponent", default="random", help="player of the server: %s, name=time_budget or name=random" % ", ".join(CONFIGS))
+    parser.add_argument("--opponent-time", type=float, default=0.0, help="seconds the server's player waits before moving")
+    parser.add_argument("--first", default="X", choices=["X", "O", "random"], help="player of the clients")
+    parser.add_argument("--output", help="file to write the JSON report to")
+    args = parser.parse_args()
+
+    report = load_test(args.clients, args.game_type, args.move_time, args.ponder, args.workers, latency=args.latency,
+        jitter=args.jitter, opponent=args.opponent, opponent_time=args.opponent_time, first=args.first)
+    print("%d games, %d moves in %.1fs, %d requests" % (args.clients, report["moves"], report["seconds"], report["requests"]))
+    for name in ("think_time", "move_latency"):
+        summary = report[name]
+        print("%-13s p50 %8.1f ms  p95 %8.1f ms  p99 %8.1f ms" % (name, summary.get("median_ms", 0), summary.get("p95_ms", 0), summary.get("p99_ms", 0)))
+    requests = report["requests_per_move"]
+    print("requests/move mean %.1f  p50 %d  p95 %d  p99 %d" % (requests.get("mean", 0), requests.get("median", 0), requests.get("p95", 0), requests.get("p99", 0)))
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
@@ -0,0 +1,263 @@
+import argparse
+import itertools
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from bitboard import COLS, ROWS, has_won, other_player, player_mask
+from utils import board_flip
+from tournament import CONFIGS, engine_move, parse_config
+
+# ----------- LOCAL GAME SERVER ----------- #
+# Stand-in for the game server with the same 4 endpoints and JSON answers, so that the clients
+# can be run and load-tested without the live host. Boards are sent top row first, as JSON in
+# the "state" field. In single player games the server plays the other side with an opponent
+# policy (a configuration of tournament.py), opponent_time seconds after the client moved.
+# Every answer is delayed by latency seconds, plus up to jitter seconds, to mimic the network.
+
+
+def empty_board():
+    return [["."] * COLS for _ in range(ROWS)]
+
+
+def drop(board, col, player):
+    """Drops a stone of player in col of a top-first board. Returns False if the column is full."""
+    for row in reversed(board):
+        if row[col] == ".":
+            row[col] = player
+            return True
+    return False
+
+
+class LocalGame:
+    """State of one game of the local server."""
+
+    def __init__(self, game_type, multi_player):
+        self.game_type = game_type
+        self.multi_player = multi_player
+        self.board = empty_board()
+        self.status = "waiting"
+        self.player = "X" # Player to move, or the winner ("-" for a draw) once complete.
+        self.joined = [] # Players given to the clients, in the order they joined.
+        self.client = None # Player of the client in single player games.
+        self.previous_boards = {"X": empty_board(), "O": empty_board()} # Board of the previous turn of every player.
+        self.opponent_due = None # Time at which the server plays its move in single player games.
+        self.turn_start = None # Time at which the client could see it was its turn.
+        self.requests = 0 # Requests since the last move of the client.
+
+    def state(self):
+        return {"state": json.dumps(self.board), "status": self.status, "player": self.player}
+
+    def move(self, col, player):
+        """Plays col for player and updates the status. Returns False if the move is illegal."""
+        if not 0 <= col < COLS or not drop(self.board, col, player):
+            return False
+        flipped = board_flip(self.board)
+        if has_won(player_mask(flipped, player)):
+            self.status = "complete"
+            self.player = player
+        elif all(cell != "." for cell in self.board[0]):
+            self.status = "complete"
+            self.player = "-"
+        else:
+            self.player = other_player(player)
+        return True
+
+
+class LocalServer:
+    """Local game server running in a background thread.
+
+    Args:
+        host, port: address to listen on, a free port if port is 0.
+        latency: seconds every answer is delayed, jitter: extra random delay of up to jitter seconds.
+        opponent: configuration of the server's player in single player games, as accepted by
+            tournament.parse_config: "random", a built-in name or name=time_budget.
+        opponent_time: seconds the server's player waits before moving.
+        first: player of the client in single player games, "X", "O" or "random".
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, jitter=0.0, opponent="random", opponent_time=0.0, first="X", seed=1):
+        self.latency = latency
+        self.jitter = jitter
+        self.opponent = parse_config(opponent)[1]
+        self.opponent_time = opponent_time
+        self.first = first
+        self.rng = random.Random(seed)
+        self.games = {}
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock() # Held while a request reads or changes the games.
+        self.engine_lock = threading.Lock() # play.play keeps global tables: the server's player thinks for one game at a time.
+        self.endpoint_requests = {}
+        self.moves = [] # {"requests", "latency"} of every move of the clients.
+        self.httpd = ThreadingHTTPServer((host, port), RequestHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.game_server = self
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return "http://%s:%d" % (host, port)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self.thread is not None:
+            self.thread.join()
+
+    def delay(self):
+        if self.latency or self.jitter:
+            time.sleep(self.latency + self.rng.random() * self.jitter)
+
+    def handle(self, path, params):
+        """Answers a request.
+
+        Returns:
+            (HTTP status, JSON answer)
+        """
+        with self.lock:
+            self.endpoint_requests[path] = self.endpoint_requests.get(path, 0) + 1
+            if path == "/new-game":
+                game_id = str(next(self.ids))
+                self.games[game_id] = LocalGame(params.get("game-type"), params.get("multi-player") == "True")
+                return 200, {"game-id": game_id}
+            if path not in ("/join-game", "/game-state", "/update-game"):
+                return 404, {"error": "unknown endpoint %s" % path}
+            game = self.games.get(params.get("game-id"))
+            if game is None:
+                return 404, {"error": "unknown game %s" % params.get("game-id")}
+            game.requests += 1
+            due_move = self.take_due_move(game)
+        if due_move is not None:
+            # Only this request waits for the server's player, the other games are served meanwhile.
+            self.play_due_move(game, *due_move)
+        with self.lock:
+            if path == "/join-game":
+                return self.join(game)
+            if path == "/game-state":
+                return 200, game.state()
+            return self.update(game, params)
+
+    def join(self, game):
+        if game.multi_player:
+            if len(game.joined) == 2:
+                return 400, {"error": "the game is full"}
+            player = "X" if not game.joined else other_player(game.joined[0])
+            game.joined.append(player)
+            if len(game.joined) == 2:
+                game.status = "playing"
+            return 200, {"player": player}
+        if game.joined:
+            return 400, {"error": "the game is full"}
+        player = self.rng.choice("XO") if self.first == "random" else self.first
+        game.joined.append(player)
+        game.client = player
+        game.status = "playing"
+        now = time.time()
+        if player == "X":
+            game.turn_start = now
+        else:
+            game.opponent_due = now + self.opponent_time
+        return 200, {"player": player}
+
+    def update(self, game, params):
+        player = params.get("player")
+        if game.status != "playing" or player != game.player:
+            return 400, {"error": "not the turn of %s" % player}
+        try:
+            col = int(json.loads(params.get("move", "")))
+        except (TypeError, ValueError):
+            return 400, {"error": "invalid move %s" % params.get("move")}
+        previous_board = [row[:] for row in game.board]
+        if not game.move(col, player):
+            return 400, {"error": "illegal move %d" % col}
+        game.previous_boards[player] = previous_board
+        if not game.multi_player:
+            self.moves.append({"requests": game.requests, "latency": time.time() - game.turn_start})
+            game.requests = 0
+            if game.status == "playing":
+                game.opponent_due = time.time() + self.opponent_time
+        return 200, game.state()
+
+    def take_due_move(self, game):
+        """Takes the move of the server's player if it is due, called with the lock held.
+
+        Returns:
+            (due time, player, previous board, board, random generator) to pass to
+            play_due_move, or None if no move is due.
+        """
+        if game.opponent_due is None or time.time() < game.opponent_due or game.status != "playing":
+            return None
+        due = game.opponent_due
+        game.opponent_due = None # Taken: no other request plays it.
+        player = other_player(game.client)
+        return (due, player, [row[:] for row in game.previous_boards[player]], [row[:] for row in game.board],
+            random.Random(self.rng.getrandbits(32)))
+
+    def play_due_move(self, game, due, player, previous_board, board, rng):
+        """Chooses the move of the server's player without the lock, then plays it unless the game changed."""
+        with self.engine_lock:
+            col = engine_move(self.opponent, previous_board, [row[:] for row in board], player, rng)
+        with self.lock:
+            if game.status != "playing" or game.player != player or game.board != board:
+                return
+            game.previous_boards[player] = board
+            if col is None or not game.move(col, player):
+                # An illegal move of the server's player loses the game, as in the tournament.
+                game.status = "complete"
+                game.player = game.client
+            # The client could have seen the move as soon as it was due.
+            game.turn_start = due
+
+    def stats(self):
+        """Returns the requests by endpoint and, for every move of the clients, the requests
+        made since their previous move and the seconds since the move became theirs."""
+        with self.lock:
+            return {"endpoints": dict(self.endpoint_requests), "moves": list(self.moves)}
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        params = {name: values[0] for name, values in parse_qs(url.query).items()}
+        server = self.server.game_server
+        server.delay()
+        status, answer = server.handle(url.path, params)
+        body = json.dumps(answer).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Runs a local stand-in of the game server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds every answer is delayed")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra random delay of up to this many seconds")
+    parser.add_argument("--opponent", default="random", help="player of the server: %s, name=time_budget or name=random" % ", ".join(CONFIGS))
+    parser.add_argument("--opponent-time", type=float, default=0.0, help="seconds the server's player waits before moving")
+    parser.add_argument("--first", default="X", choices=["X", "O", "random"], help="player of the client")
+    args = parser.parse_args()
+
+    server = LocalServer(args.host, args.port, args.latency, args.jitter, args.opponent, args.opponent_time, args.first)
+    print("Serving on %s, run the clients with CONNECT4_SERVER=%s" % (server.url, server.url))
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
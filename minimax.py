@@ -1,15 +1,10 @@
-from copy import deepcopy
-from utils import find_strong_threat
+import time
+from utils import board_flip, find_strong_threat, possible_actions
+from bitboard import ROWS, COLS, COLUMN_BITS, ZOBRIST_SIDE, player_mask
+from groups import completed_group_ids, counted_position
+from transposition import EXACT, LOWER, UPPER
 
 # ----------- HELPER FUNCTIONS ----------- #
-def board_flip(board):
-    """Returns a new board with the board flipped vertically.
-    This allows accessing the lower row as the first item in the list."""
-    new_board =deepcopy(board)
-    #print((list(new_board)))
-    new_board.reverse()
-    return new_board
-
 def is_end(board):
     for col in range(len(board[0])):
         if board[-1][col] == ".":
@@ -18,42 +13,7 @@ def is_end(board):
 
 
 def check_win(board, player):
-    #check rows
-    for row in board:
-        if player*4 in "".join(row):
-            return True
-
-    #check cols
-    for col in list(zip(*board)):
-        if player*4 in "".join(col):
-            return True
-
-    
-    #check diagonals
-    for i in range(3):
-        for j in range(4):
-            if board[i][j]==player and board[i+1][j+1]==player and board[i+2][j+2]==player and board[i+3][j+3]==player:
-                return True
-
-    for i in range(3):
-        for j in range(3,7):
-            if board[i][j]==player and board[i+1][j-1]==player and board[i+2][j-2]==player and board[i+3][j-3]==player:
-                return True
-                
-    
-  
-    return False
-
-def possible_actions(board):# board_flip(board)
-    """Returns a list of all directly playable actions (row, col) on a board."""
-    actions = []
-    for col in range(len(board[0])):
-        for row in range(len(board)):
-            if board[row][col] == '.':
-                actions.append((row,col))
-                break
-    # playable_cols = [x[1] for x in actions]
-    return actions # [(0,1), (1,2)....]
+    return len(completed_group_ids(player_mask(board, player))) > 0
 
 def fill_possible_actions(board, possible_actions, player):
     """Returns a new board with the possible actions filled in.
@@ -65,7 +25,7 @@ def fill_possible_actions(board, possible_actions, player):
     """
     boards = []
     for row, col in possible_actions:
-        new_board = deepcopy(board)
+        new_board = [cells[:] for cells in board]
         new_board[row][col] = player
         boards.append(new_board)
     return boards
@@ -80,6 +40,9 @@ def other_player(player):
 
 # ----------- MINIMAX ----------- #
 
+INFINITY = 1000
+MAX_PLY = ROWS * COLS
+
 def heuristic(board, player):
     if player == "X":
         oppponent = "O"
@@ -97,32 +60,310 @@ def heuristic(board, player):
 
     return score
 
-def minimax(board, player,is_maximizing, tree_depth, alpha, beta):
-    if tree_depth == 0 or is_end(board):
-        return heuristic(board, player), board
+def position_heuristic(position, player):
+    """Same score as heuristic, computed on a Position."""
+    opponent = other_player(player)
+    score = 0
+    if position.has_won(player):
+        score += 40
+    if position.has_won(opponent):
+        score -= 40
+    if position.has_strong_threat(opponent):
+        score -= 17
+    if position.has_strong_threat(player):
+        score += 17
+    return score
+
+
+# ----------- MOVE ORDERING ----------- #
+
+CENTER_ORDER = (3, 2, 4, 1, 5, 0, 6)
+LEFT_TO_RIGHT_ORDER = tuple(range(COLS))
+
+
+class MoveOrdering:
+    """Decides in which order the columns of a node are searched.
+
+    Columns are tried as: hash move (best move stored for the position), killer moves
+    (moves that caused a cutoff at the same ply), then by history score (cutoffs caused by
+    the same square for the same player) and finally in the static order. Every part can
+    be switched off to compare orderings.
+    """
+
+    def __init__(self, center=True, hash_move=True, killers=True, history=True):
+        self.static_order = CENTER_ORDER if center else LEFT_TO_RIGHT_ORDER
+        self.use_hash_move = hash_move
+        self.use_killers = killers
+        self.use_history = history
+        self.killers = [[None, None] for _ in range(MAX_PLY + 1)]
+        self.history = {"X": [0] * (COLS * COLUMN_BITS), "O": [0] * (COLS * COLUMN_BITS)}
+
+    def order(self, position, player, ply, hash_move=None):
+        """Returns the playable columns of position in the order they should be searched."""
+        heights = position.heights
+        columns = [col for col in self.static_order if heights[col] < ROWS]
+        if self.use_history:
+            history = self.history[player]
+            columns.sort(key=lambda col: -history[col * COLUMN_BITS + heights[col]])
+        if self.use_killers:
+            for killer in reversed(self.killers[ply]):
+                if killer is not None and killer in columns:
+                    columns.remove(killer)
+                    columns.insert(0, killer)
+        if self.use_hash_move and hash_move is not None and hash_move in columns:
+            columns.remove(hash_move)
+            columns.insert(0, hash_move)
+        return columns
+
+    def cutoff(self, position, player, ply, col, depth):
+        """Records that col caused a beta cutoff. Called with col still to be played."""
+        if self.use_killers:
+            killers = self.killers[ply]
+            if killers[0] != col:
+                killers[1] = killers[0]
+                killers[0] = col
+        if self.use_history:
+            self.history[player][col * COLUMN_BITS + position.heights[col]] += depth * depth
+
+
+# ----------- SEARCH ----------- #
+
+class SearchTimeout(Exception):
+    """Raised inside a search when its deadline has passed."""
+
+
+class Search:
+    """Fail-soft alpha-beta negamax that plays and undoes moves on a single Position.
+
+    Children are generated one column at a time, so nothing is done for the columns
+    left after a cutoff. The principal variation is kept in a preallocated triangular
+    table, so the only allocation per node is the short list of ordered columns.
+    """
+
+    def __init__(self, table=None, deadline=None, ordering=None):
+        self.table = table
+        self.deadline = deadline # Wall-clock time (time.time()) at which the search gives up.
+        self.ordering = ordering if ordering is not None else MoveOrdering()
+        self.root_move = None # Column tried first at the root, e.g. the best move of the previous iteration.
+        self.nodes = 0
+        self.cutoffs = 0
+        self.best_col = None # Best column found at the root by the last call.
+        self.limit_ply = None # Ply at which beta is capped by limit, which poll may lower during the search.
+        self.limit = INFINITY
+        self.pv_table = [[0] * MAX_PLY for _ in range(MAX_PLY + 1)]
+        self.pv_length = [0] * (MAX_PLY + 1)
+
+    def negamax(self, position, player, depth, alpha, beta, ply=0):
+        """Returns the score of position for player, the player to move."""
+        self.nodes += 1
+        if self.nodes & 255 == 0:
+            self.poll()
+        self.pv_length[ply] = ply
+        opponent = "O" if player == "X" else "X"
+
+        # The last move may have ended the game.
+        if depth == 0 or position.moves == MAX_PLY or position.has_won(opponent):
+            return position_heuristic(position, player)
+
+        table = self.table
+        hash_move = None
+        if table is not None:
+            # A position and its mirror image share one entry, stored under the smaller hash
+            # with the move of that side.
+            mirrored = position.mirror_hash < position.hash
+            key = (position.mirror_hash if mirrored else position.hash) ^ ZOBRIST_SIDE[player]
+            entry = table.probe(key)
+            if entry is not None:
+                _, score, flag, entry_depth, hash_move = entry
+                if mirrored and hash_move is not None:
+                    hash_move = COLS - 1 - hash_move
+                if entry_depth >= depth and ply > 0:
+                    if flag == EXACT or (flag == LOWER and score >= beta) or (flag == UPPER and score <= alpha):
+                        return score
+        if ply == 0 and self.root_move is not None:
+            hash_move = self.root_move
+
+        alpha_start = alpha
+        best_score = -INFINITY
+        best_col = None
+        for col in self.ordering.order(position, player, ply, hash_move):
+            position.play(col, player)
+            score = -self.negamax(position, opponent, depth - 1, -beta, -alpha, ply + 1)
+            position.undo(col)
+            if score > best_score:
+                best_score = score
+                best_col = col
+                if score > alpha:
+                    alpha = score
+                    self.update_pv(ply, col)
+                    if alpha >= beta:
+                        self.cutoffs += 1
+                        self.ordering.cutoff(position, player, ply, col, depth)
+                        break
+            if ply == self.limit_ply and self.limit < beta:
+                beta = self.limit
+                if best_score >= beta:
+                    self.cutoffs += 1
+                    break
+
+        if ply == 0:
+            self.best_col = best_col
+        if table is not None:
+            if best_score <= alpha_start:
+                flag = UPPER
+            elif best_score >= beta:
+                flag = LOWER
+            else:
+                flag = EXACT
+            if mirrored and best_col is not None:
+                table.store(key, best_score, flag, depth, COLS - 1 - best_col)
+            else:
+                table.store(key, best_score, flag, depth, best_col)
+        return best_score
+
+    def poll(self):
+        """Called every 256 nodes. Raises SearchTimeout once the deadline has passed."""
+        if self.deadline is not None and time.time() >= self.deadline:
+            raise SearchTimeout()
+
+    def update_pv(self, ply, col):
+        """Puts col in front of the principal variation found below it."""
+        row = self.pv_table[ply]
+        child = self.pv_table[ply + 1]
+        row[ply] = col
+        length = self.pv_length[ply + 1]
+        for i in range(ply + 1, length):
+            row[i] = child[i]
+        self.pv_length[ply] = max(length, ply + 1)
+
+    def principal_variation(self):
+        return self.pv_table[0][:self.pv_length[0]]
+
+
+def search(board, player, tree_depth, table=None, alpha=-INFINITY, beta=INFINITY, ordering=None):
+    """Searches a flipped board for player.
+
+    Returns:
+        (column, score, principal_variation). Column is None if the board is full.
+    """
+    position = counted_position(board)
+    searcher = Search(table, ordering=ordering)
+    score = searcher.negamax(position, player, tree_depth, alpha, beta)
+    return searcher.best_col, score, searcher.principal_variation()
+
 
+def minimax(board, player,is_maximizing, tree_depth, alpha, beta, table=None):
+    """Board-in, board-out wrapper around search, kept for older callers.
+
+    Returns:
+        (score for player, board after the best move)
+    """
+    mover = player if is_maximizing else other_player(player)
     if is_maximizing:
-        max_score = -1000
-        best_move = None
-        for move in fill_possible_actions(board, possible_actions(board), player):
-            score = minimax(move, player,False, tree_depth-1, alpha, beta)[0] # To reduce memory usage we only get the score [0] when calling this recursive function (not the best_move)
-            max_score = max(max_score, score)
-            if max_score == score:
-                best_move = move
-            alpha = max(alpha, score)
-            if beta <= alpha:
-                break
-        return max_score, best_move
+        column, score, _ = search(board, mover, tree_depth, table, alpha, beta)
     else:
-        min_score = 1000
-        best_move = None
-        for move in fill_possible_actions(board, possible_actions(board), other_player(player)):
-            score = minimax(move,other_player(player) ,True, tree_depth - 1, alpha, beta)[0] # To reduce memory usage we only get the score [0] when calling this recursive function (not the best_move)
-            min_score = max(min_score, score)
-            if min_score == score:
-                best_move = move
-            beta = min(beta, score)
-            if beta <= alpha:
-                break
-        return min_score, best_move
+        column, score, _ = search(board, mover, tree_depth, table, -beta, -alpha)
+        score = -score
+    if column is None:
+        return score, board
+    for row, col in possible_actions(board):
+        if col == column:
+            return score, fill_possible_actions(board, [(row, col)], mover)[0]
+
+
+def iterative_deepening(board, player, deadline, table=None, max_depth=MAX_PLY, ordering=None, stats=None):
+    """Searches depth 1, 2, 3, ... until the deadline passes.
+
+    The best move of every completed iteration is tried first in the next one.
+    Depth 1 is always completed so that there is a move to return.
+
+    stats: optional dictionary, filled with the nodes searched, cutoffs and completed depth
+        of all iterations, and the transposition table hits and misses.
+
+    Returns:
+        (column, score, principal_variation, depth) of the last completed iteration.
+    """
+    position = counted_position(board)
+    searcher = Search(table, ordering=ordering)
+    if table is not None:
+        hits, misses = table.hits, table.misses
+    max_depth = min(max_depth, MAX_PLY - position.moves)
+    result = (None, position_heuristic(position, player), [], 0)
+    for depth in range(1, max_depth + 1):
+        searcher.deadline = deadline if depth > 1 else None
+        try:
+            score = searcher.negamax(position, player, depth, -INFINITY, INFINITY)
+        except SearchTimeout:
+            break
+        result = (searcher.best_col, score, searcher.principal_variation(), depth)
+        searcher.root_move = searcher.best_col
+        if time.time() >= deadline:
+            break
+    if stats is not None:
+        stats["nodes"] = searcher.nodes
+        stats["cutoffs"] = searcher.cutoffs
+        stats["depth"] = result[3]
+        if table is not None:
+            stats["tt_hits"] = table.hits - hits
+            stats["tt_misses"] = table.misses - misses
+    return result
+
+
+# ----------- TESTING ----------- #
+
+if __name__ == "__main__":
+    from transposition import TranspositionTable
+
+    diagram6_1 = board_flip([
+        [".", ".", ".", "X", ".", ".", "."], 
+        [".", ".", ".", "O", ".", ".", "."], 
+        [".", ".", ".", "X", ".", ".", "."], 
+        [".", ".", ".", "O", ".", ".", "."], 
+        [".", ".", ".", "X", ".", ".", "."], 
+        [".", ".", "X", "O", "O", ".", "."]])
+
+    diagram6_5 = board_flip([
+        [".", ".", ".", ".", ".", ".", "."], 
+        [".", ".", ".", ".", ".", ".", "."], 
+        [".", "X", "O", "O", "O", ".", "."], 
+        [".", "O", "X", "X", "X", ".", "."], 
+        ["O", "X", "X", "O", "O", ".", "."], 
+        ["O", "X", "X", "X", "O", ".", "."]])
+
+    diagram6_10 = board_flip([
+        [".", ".", ".", ".", ".", ".", "."], 
+        [".", ".", "O", ".", ".", ".", "."], 
+        [".", ".", "X", ".", ".", ".", "."], 
+        [".", ".", "O", ".", ".", ".", "."], 
+        [".", ".", "X", "O", ".", ".", "."], 
+        [".", ".", "X", "X", "O", ".", "."]])
+
+    diagram8_1 = board_flip([
+        [".", ".", ".", ".", ".", ".", "."], 
+        [".", ".", ".", ".", ".", ".", "."], 
+        [".", ".", ".", "O", "X", ".", "."], 
+        [".", "X", "X", "X", "O", ".", "."], 
+        [".", "X", "O", "O", "O", ".", "."], 
+        ["X", "O", "X", "X", "O", ".", "."]])
 
+    # Nodes searched by iterative deepening up to test_depth with every move ordering.
+    orderings = {
+        "left to right": lambda: MoveOrdering(center=False, hash_move=False, killers=False, history=False),
+        "center": lambda: MoveOrdering(hash_move=False, killers=False, history=False),
+        "center + hash": lambda: MoveOrdering(killers=False, history=False),
+        "center + hash + killers": lambda: MoveOrdering(history=False),
+        "all": lambda: MoveOrdering(),
+    }
+    test_depth = 7
+    player = "X"
+    for name, diagram in [("diagram6_1", diagram6_1), ("diagram6_5", diagram6_5), ("diagram6_10", diagram6_10), ("diagram8_1", diagram8_1)]:
+        print(name)
+        for ordering_name, make_ordering in orderings.items():
+            position = counted_position(diagram)
+            searcher = Search(TranspositionTable(), ordering=make_ordering())
+            start = time.time()
+            for depth in range(1, test_depth + 1):
+                score = searcher.negamax(position, player, depth, -INFINITY, INFINITY)
+                searcher.root_move = searcher.best_col
+            print("   %-25s nodes %7d  cutoffs %6d  column %d  score %3d  %.2fs" % (
+                ordering_name, searcher.nodes, searcher.cutoffs, searcher.best_col, score, time.time() - start))
@@ -0,0 +1,184 @@
+import atexit
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from bitboard import other_player
+from groups import counted_position
+from minimax import CENTER_ORDER, INFINITY, MAX_PLY, Search, SearchTimeout
+from transposition import TranspositionTable
+
+# ----------- ROOT-PARALLEL SEARCH ----------- #
+# Every playable root column is searched by a worker of a persistent process pool. The best
+# score found so far is shared through a small shared-memory array [alpha, order index of
+# the column that set it]. A worker reads it when its column starts and again every 256 nodes
+# (SharedBoundSearch.poll), and lowers beta at the root child to match, so that a better score
+# found by another worker also prunes the columns already being searched.
+#
+# A column only needs to beat alpha strictly if the column that set alpha comes before it in
+# the root order, and only needs to equal it otherwise. With that rule the chosen column is
+# the first column with the best score in root order, exactly as in the sequential search.
+
+_pool = None
+_shared = None
+_search_lock = threading.Lock() # One parallel search at a time shares the alpha array.
+
+# Worker state, kept warm between moves.
+_worker_shared = None
+_worker_table = None
+
+
+def _init_worker(shared):
+    global _worker_shared, _worker_table
+    _worker_shared = shared
+    _worker_table = TranspositionTable()
+
+
+def _shared_bound(index):
+    """Returns the score the root column of order index must beat to be the best so far."""
+    with _worker_shared.get_lock():
+        alpha, alpha_index = _worker_shared[0], _worker_shared[1]
+    return alpha if alpha_index < index else alpha - 1
+
+
+class SharedBoundSearch(Search):
+    """Search of a root child that caps its beta with the shared alpha of the workers."""
+
+    def __init__(self, table, deadline, index):
+        super().__init__(table, deadline)
+        self.index = index
+        self.limit_ply = 1
+        self.limit = -_shared_bound(index)
+
+    def poll(self):
+        super().poll()
+        self.limit = min(self.limit, -_shared_bound(self.index))
+
+
+def _search_column(board, player, col, index, depth, deadline, use_table):
+    """Searches the root move col in a worker.
+
+    Returns:
+        (col, score, exact, principal_variation, counters), or None if the deadline passed.
+        If exact is False, score is only an upper bound that can't beat the shared alpha.
+        counters: (nodes, cutoffs, transposition table hits, misses) of the search.
+    """
+    opponent = other_player(player)
+    position = counted_position(board)
+    position.play(col, player)
+
+    table = _worker_table if use_table else None
+    hits, misses = _worker_table.hits, _worker_table.misses
+    searcher = SharedBoundSearch(table, deadline, index)
+    try:
+        score = -searcher.negamax(position, opponent, depth - 1, -INFINITY, searcher.limit, 1)
+    except SearchTimeout:
+        return None
+    exact = score > -searcher.limit # The bound may have risen during the search.
+    if exact:
+        with _worker_shared.get_lock():
+            if score > _worker_shared[0] or (score == _worker_shared[0] and index < _worker_shared[1]):
+                _worker_shared[0] = score
+                _worker_shared[1] = index
+    principal_variation = [col] + searcher.pv_table[1][1:searcher.pv_length[1]]
+    counters = (searcher.nodes, searcher.cutoffs, _worker_table.hits - hits, _worker_table.misses - misses)
+    return col, score, exact, principal_variation, counters
+
+
+def get_pool(workers=None):
+    """Returns the process pool, starting it on first use. The workers stay alive between moves."""
+    global _pool, _shared
+    if _pool is None:
+        _shared = multiprocessing.Array("i", [-INFINITY, 0])
+        _pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(_shared,))
+    return _pool
+
+
+def shutdown_pool():
+    global _pool, _shared
+    if _pool is not None:
+        _pool.shutdown()
+        _pool = None
+        _shared = None
+
+atexit.register(shutdown_pool)
+
+
+def root_order(board, root_move=None):
+    """Returns the playable root columns: root_move first, then the center-out order."""
+    heights = counted_position(board).heights
+    columns = [col for col in CENTER_ORDER if heights[col] < len(board)]
+    if root_move in columns:
+        columns.remove(root_move)
+        columns.insert(0, root_move)
+    return columns
+
+
+def parallel_search(board, player, tree_depth, root_move=None, deadline=None, use_table=True, stats=None):
+    """Searches the root columns of a flipped board in parallel.
+
+    Gives the same column and score as minimax.search with the same root order. Workers keep
+    their transposition tables between searches, so, as with a table kept by the sequential
+    search, results may come from deeper searches done before; use_table=False turns them off.
+
+    Returns:
+        (column, score, principal_variation). Column is None if the board is full.
+
+    Raises:
+        SearchTimeout: if the deadline passed before every column was searched.
+    """
+    position = counted_position(board)
+    if tree_depth == 0 or position.moves == MAX_PLY or position.has_won(other_player(player)):
+        return None, Search().negamax(position, player, 0, -INFINITY, INFINITY), []
+    columns = root_order(board, root_move)
+
+    with _search_lock:
+        pool = get_pool()
+        with _shared.get_lock():
+            _shared[0] = -INFINITY
+            _shared[1] = len(columns)
+        futures = [pool.submit(_search_column, board, player, col, index, tree_depth, deadline, use_table) for index, col in enumerate(columns)]
+        results = [future.result() for future in futures]
+
+    if stats is not None:
+        for result in results:
+            if result is not None:
+                for name, count in zip(("nodes", "cutoffs", "tt_hits", "tt_misses"), result[4]):
+                    stats[name] = stats.get(name, 0) + count
+    if any(result is None for result in results):
+        raise SearchTimeout()
+    best = None
+    for col, score, exact, principal_variation, _ in results: # In root order, so ties keep the first column.
+        if exact and (best is None or score > best[1]):
+            best = (col, score, principal_variation)
+    return best
+
+
+def parallel_iterative_deepening(board, player, deadline, max_depth=MAX_PLY, stats=None):
+    """Same as minimax.iterative_deepening, with every iteration searched by parallel_search.
+
+    stats: optional dictionary, filled with the nodes, cutoffs and table hits and misses of all
+        iterations, summed over the workers, and the completed depth.
+
+    Returns:
+        (column, score, principal_variation, depth) of the last completed iteration.
+    """
+    position = counted_position(board)
+    max_depth = min(max_depth, MAX_PLY - position.moves)
+    result = (None, Search().negamax(position, player, 0, -INFINITY, INFINITY), [], 0)
+    if stats is not None:
+        stats.update(nodes=0, cutoffs=0, tt_hits=0, tt_misses=0)
+    root_move = None
+    for depth in range(1, max_depth + 1):
+        try:
+            column, score, principal_variation = parallel_search(board, player, depth, root_move, deadline if depth > 1 else None, stats=stats)
+        except SearchTimeout:
+            break
+        result = (column, score, principal_variation, depth)
+        root_move = column
+        if time.time() >= deadline:
+            break
+    if stats is not None:
+        stats["depth"] = result[3]
+    return result
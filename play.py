@@ -1,6 +1,18 @@
+import contextlib
+import cProfile
+import os
+import pstats
+import sys
+import time
+import tracemalloc
 from victor import evaluate
-from utils import board_flip, compare, compare2, find_strong_threat, stop_threat
-from minimax import minimax
+from utils import board_flip, compare2, find_strong_threat, stop_threat
+from minimax import SearchTimeout, iterative_deepening
+from parallel import parallel_iterative_deepening
+from book import probe as probe_book
+from tablebase import probe as probe_tablebase
+from transposition import TranspositionTable
+from solver import solve
 
 initial_board = board_flip([
     [".", ".", ".", ".", ".", ".", "."], 
@@ -10,19 +22,98 @@ initial_board = board_flip([
     [".", ".", ".", ".", ".", ".", "."], 
     [".", ".", ".", ".", ".", ".", "."]])
 
-def play(previous_board, board, player):
+# Kept between moves (and games) so that positions searched before are not searched again.
+transposition_table = TranspositionTable()
+
+# Seconds of thinking per move when the caller does not give a budget.
+MOVE_TIME = 1.0
+
+# Profiler run on every move when the caller does not ask for one: "cprofile", "tracemalloc"
+# or None. Set with the CONNECT4_PROFILE environment variable.
+PROFILE = os.environ.get("CONNECT4_PROFILE") or None
+PROFILE_LINES = 20 # Lines of the printed profile reports.
+
+# Shallowest pondered search answered without searching again.
+PONDER_MIN_DEPTH = 4
+
+# Engine modes: "default" (book, victor and minimax) or "solver", which first tries to solve the
+# position exactly with solver.solve in SOLVER_SHARE of the time budget, and falls back to the
+# default engine if that is not enough.
+MODES = ("default", "solver")
+SOLVER_SHARE = 0.5
+
+def play(previous_board, board, player, time_budget=MOVE_TIME, parallel=False, stats=None, profile=None, ponderer=None, mode="default"):
     # Returns column to play
+    # parallel: search the root columns on the process pool of parallel.py
+    # stats: optional dictionary, filled with how the move was decided:
+    #   engine: "opening", "book", "tablebase", "solver", "victor", "threat" (stop or make a strong threat), "ponder" or "minimax"
+    #   solver: nodes, searches and score of solver.solve in "solver" mode, and whether it timed out
+    #   victor: statistics of victor.evaluate (solutions, groups, graph edges, backtracks, ...)
+    #   search: statistics of the search (nodes, cutoffs, depth, score, transposition table hits, ...)
+    #   stage_times: seconds spent in every stage, total_time: seconds spent in play
+    # profile: "cprofile" or "tracemalloc" to profile the move, PROFILE by default. The report
+    #   is put in stats["profile"], or printed to stderr if there is no stats dictionary.
+    # ponderer: ponder.Ponderer that searched the opponent's replies, stopped before deciding.
+    #   Its result for board is played instead of searching if it is deep enough.
+    # mode: one of MODES
+    if mode not in MODES:
+        raise ValueError("Unknown mode %s, expected one of %s" % (mode, ", ".join(MODES)))
+    start = time.perf_counter()
+    record = stats if stats is not None else {}
+    record["stage_times"] = {}
+    profile = profile or PROFILE
+    with profiled(profile, record):
+        column = decide(previous_board, board, player, time_budget, parallel, record, ponderer, mode)
+    record["total_time"] = time.perf_counter() - start
+    if profile and stats is None:
+        print_profile(record["profile"])
+    return column
+
+def decide(previous_board, board, player, time_budget, parallel, record, ponderer=None, mode="default"):
+    deadline = time.time() + time_budget
+    stage_times = record["stage_times"]
+    if ponderer is not None:
+        ponderer.stop() # The transposition table and the caches are not shared between threads.
     
     # Format the boards
     board = board_flip(board)
     previous_board = board_flip(previous_board)
 
     if board == initial_board:
+        record["engine"] = "opening"
         return 3 # Plays the first move in the middle 
-    solutions = evaluate(previous_board, player) # solutions is a list of dictionaries with the chosen_set from victor
+    start = time.perf_counter()
+    book_column = probe_book(board, player)
+    stage_times["book"] = time.perf_counter() - start
+    if book_column is not None: # Known opening position
+        record["engine"] = "book"
+        return book_column
+    start = time.perf_counter()
+    tablebase_column = probe_tablebase(board, player)
+    stage_times["tablebase"] = time.perf_counter() - start
+    if tablebase_column is not None: # Solved endgame position
+        record["engine"] = "tablebase"
+        return tablebase_column
+    if mode == "solver":
+        start = time.perf_counter()
+        record["solver"] = {}
+        try:
+            score, column = solve(board, player, deadline=time.time() + time_budget * SOLVER_SHARE, stats=record["solver"])
+        except SearchTimeout:
+            record["solver"]["timeout"] = True
+        else:
+            record["solver"]["score"] = score
+            record["engine"] = "solver"
+            return column
+        finally:
+            stage_times["solver"] = time.perf_counter() - start
+    start = time.perf_counter()
+    record["victor"] = {}
+    solutions = evaluate(previous_board, player, record["victor"]) # solutions is a list of dictionaries with the chosen_set from victor
+    stage_times["victor"] = time.perf_counter() - start
     if len(solutions) == 0: # If victor is sleeping, play minimax
-        _, next_move_board = minimax(board, player, True, 3, -1000, 1000)
-        return compare(board,next_move_board)
+        column = think(board, player, deadline, parallel, record, ponderer)
+        return column
     else: # If victor is awake, play victor
         square_to_play = {} # Dictionary that links squares (played by the opponent) to play (played by the player)
         #print("Solutions", len(solutions))
@@ -50,21 +141,94 @@ def play(previous_board, board, player):
             print("Victor lets minimax handle strong threat")
             stop_threat_square = stop_threat(board, player)
             if stop_threat_square:
+                record["engine"] = "threat"
                 return stop_threat_square[1]
             get_threat_square = stop_threat(board, opponent)
             if get_threat_square:
+                record["engine"] = "threat"
                 return get_threat_square[1]
             print("minimax")
-            _, next_move_board = minimax(board, player, True, 2, -1000, 1000)
-            return compare(board, next_move_board)
+            column = think(board, player, deadline, parallel, record, ponderer)
+            return column
 
         if opponent_move in square_to_play.keys():
             print("Victor plays", square_to_play[opponent_move][1])
+            record["engine"] = "victor"
             return square_to_play[opponent_move][1]
         else:
             print("Victor sleeps")
-            _, next_move_board = minimax(board, player, True, 2, -1000, 1000)
-            return compare(board, next_move_board)
+            column = think(board, player, deadline, parallel, record, ponderer)
+            return column
+
+def think(board, player, deadline, parallel=False, record=None, ponderer=None):
+    """Searches with iterative deepening until the deadline and returns the best column.
+    record: optional stats dictionary of play, the search statistics are added to it.
+    ponderer: stopped ponder.Ponderer, whose result for board is returned if it was searched
+        to PONDER_MIN_DEPTH or deeper."""
+    start = time.perf_counter()
+    pondered = ponderer.lookup(board, player) if ponderer is not None else None
+    if pondered is not None and pondered[0] is not None and pondered[2] >= PONDER_MIN_DEPTH:
+        if record is not None:
+            record["engine"] = "ponder"
+            record["search"] = {"depth": pondered[2], "score": pondered[1]}
+            record["stage_times"]["search"] = time.perf_counter() - start
+        return pondered[0]
+    search_stats = {}
+    if parallel:
+        column, score, _, _ = parallel_iterative_deepening(board, player, deadline, stats=search_stats)
+    else:
+        column, score, _, _ = iterative_deepening(board, player, deadline, transposition_table, stats=search_stats)
+    search_stats["score"] = score
+    if record is not None:
+        record["engine"] = "minimax"
+        record["search"] = search_stats
+        record["stage_times"]["search"] = time.perf_counter() - start
+    return column
+
+
+# ----------- PROFILING ----------- #
+
+@contextlib.contextmanager
+def profiled(profile, record):
+    """Profiles the code run inside the with block and puts the report in record["profile"].
+    profile: None (no profiling), "cprofile" (a pstats.Stats of the calls) or "tracemalloc"
+        (current and peak memory and the lines that allocated the most)."""
+    if not profile:
+        yield
+    elif profile == "cprofile":
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            record["profile"] = pstats.Stats(profiler)
+    elif profile == "tracemalloc":
+        was_tracing = tracemalloc.is_tracing()
+        if not was_tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        try:
+            yield
+        finally:
+            current, peak = tracemalloc.get_traced_memory()
+            top = tracemalloc.take_snapshot().statistics("lineno")[:PROFILE_LINES]
+            if not was_tracing:
+                tracemalloc.stop()
+            record["profile"] = {"current_bytes": current, "peak_bytes": peak, "top": [str(stat) for stat in top]}
+    else:
+        raise ValueError("unknown profile:", profile)
+
+def print_profile(report):
+    if isinstance(report, pstats.Stats):
+        report.stream = sys.stderr
+        report.sort_stats("cumulative").print_stats(PROFILE_LINES)
+    else:
+        print("Memory: %(current_bytes)d bytes, peak %(peak_bytes)d bytes" % report, file=sys.stderr)
+        for line in report["top"]:
+            print(line, file=sys.stderr)
+
+
 
 def baseinverse_plays(solution, square_to_play):
     squares = solution["squares"]
@@ -151,4 +315,6 @@ if __name__ == "__main__":
     for row in board_flip(test_diagram):
         print(row)
     print("Player:", player)
-    play(previous_diagram, test_diagram, player)
+    stats = {}
+    play(previous_diagram, test_diagram, player, stats=stats)
+    print("Stats:", stats)
@@ -0,0 +1,101 @@
+import threading
+
+from bitboard import from_board, other_player
+from groups import counted_position
+from minimax import CENTER_ORDER, INFINITY, MAX_PLY, Search, SearchTimeout
+from utils import board_flip
+from victor import evaluate
+
+# ----------- PONDERING ----------- #
+# While the opponent thinks, a background thread searches every reply it can play, the most
+# likely first, one depth at a time over all of them. The searches share play's transposition
+# table, and the chosen set of victor for the position is computed on the way, so the caches are
+# warm when the move arrives. The pondering has to be stopped before play searches itself, as
+# the table is not shared between threads.
+
+
+class Ponderer:
+    """Searches the positions after every reply of the opponent in a background thread.
+
+    Args:
+        table: the transposition table of the searches, normally play.transposition_table.
+        max_depth: deepest search done for a reply.
+    """
+
+    def __init__(self, table, max_depth=MAX_PLY):
+        self.table = table
+        self.max_depth = max_depth
+        self.results = {} # (position key, player) -> (column, score, depth) of the deepest completed search
+        self.thread = None
+        self.stopped = threading.Event()
+        self.searcher = None # Search running in the thread, stopped by setting its deadline.
+        self.board = None
+
+    def start(self, board, player):
+        """Starts pondering a board (top row first, as sent by the server) on which the opponent
+        of player is to move. Does nothing if that board is already being pondered."""
+        if self.thread is not None and self.thread.is_alive() and self.board == board:
+            return
+        self.stop()
+        self.board = [row[:] for row in board]
+        self.results = {}
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self.run, args=(board_flip(board), player), daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stops the pondering and waits for the thread. The results found so far are kept."""
+        self.stopped.set()
+        searcher = self.searcher
+        if searcher is not None:
+            searcher.deadline = 0 # Makes the search raise SearchTimeout at its next clock check.
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        self.searcher = None
+
+    def lookup(self, board, player):
+        """Returns (column, score, depth) pondered for a flipped board with player to move, or None."""
+        return self.results.get((from_board(board).key(), player))
+
+    def run(self, board, player):
+        opponent = other_player(player)
+        # play evaluates the board before the opponent's move with victor.
+        evaluate(board, player)
+
+        position = counted_position(board)
+        replies = []
+        for col in self.likely_replies(position, opponent):
+            if position.is_winning_move(col, opponent):
+                continue # The game ends, nothing to answer.
+            child = position.copy()
+            child.play(col, opponent)
+            if child.moves < MAX_PLY:
+                replies.append((child, Search(self.table)))
+
+        for depth in range(1, self.max_depth + 1):
+            for child, searcher in replies:
+                if depth > MAX_PLY - child.moves:
+                    continue
+                # Set before checking the event, so that stop either sees this searcher or is seen here.
+                self.searcher = searcher
+                if self.stopped.is_set():
+                    return
+                try:
+                    score = searcher.negamax(child, player, depth, -INFINITY, INFINITY)
+                except SearchTimeout:
+                    return
+                searcher.root_move = searcher.best_col
+                self.results[(child.key(), player)] = (searcher.best_col, score, depth)
+            if all(depth >= MAX_PLY - child.moves for child, _ in replies):
+                return
+
+    def likely_replies(self, position, opponent):
+        """Returns the playable columns of the opponent, the best move stored in the table first."""
+        columns = [col for col in CENTER_ORDER if position.can_play(col)]
+        searcher = Search(self.table)
+        searcher.negamax(position, opponent, 2, -INFINITY, INFINITY)
+        if searcher.best_col in columns:
+            columns.remove(searcher.best_col)
+            columns.insert(0, searcher.best_col)
+        return columns
@@ -1,4 +1,7 @@
+from functools import lru_cache
 from utils import *
+from bitboard import BOARD_MASK, COLS, COLUMN_MASKS, ROWS, square_bit
+from groups import GROUPS, GROUP_DIRECTIONS, GROUP_MASKS, TOP_ROW_MASK, alive_group_ids
 import time
 
 # ----------- GAME RULES ----------- #
@@ -167,6 +170,60 @@ def find_base_claims(board):
                             baseclaims.append((square3, square2, square1, square4))
     return baseclaims
 
+# ----------- RULE TABLES ----------- #
+# Claimevens, baseinverses and verticals only depend on which squares are empty, i.e. on the
+# height of every column. They are found once for every height vector, by running the rules
+# above on a board filled up to those heights, and cached with the bitmasks of the squares of
+# their Solutions, which combination.encode_solution then does not recompute. Only the rules
+# used by solution.compute_all_solutions are kept, an entry is about 6 KB.
+
+RULE_TABLE_SIZE = 1 << 12
+
+def board_heights(board):
+    """Returns the height of every column of a flipped board, as a tuple."""
+    heights = [0] * COLS
+    for row in range(ROWS):
+        cells = board[row]
+        for col in range(COLS):
+            if cells[col] != ".":
+                heights[col] = row + 1
+    return tuple(heights)
+
+def squares_masks(squares):
+    """Returns (squares_mask, columns_mask): the bitboard of squares and of all the squares of their columns."""
+    squares_mask = 0
+    columns_mask = 0
+    for row, col in squares:
+        squares_mask |= square_bit(row, col)
+        columns_mask |= COLUMN_MASKS[col]
+    return squares_mask, columns_mask
+
+@lru_cache(maxsize=RULE_TABLE_SIZE)
+def rule_table(heights):
+    """Returns the rules of every board whose columns have the given heights (a tuple).
+
+    Returns:
+        Dictionary with, for "claimevens", "baseinverses" and "verticals", a tuple with the
+        rules in the format of the find_* function, and for "claimeven_masks",
+        "baseinverse_masks" and "vertical_masks", the squares_masks of the Solution of every
+        rule, in the same order.
+    """
+    board = [["X" if row < heights[col] else "." for col in range(COLS)] for row in range(ROWS)]
+    claimevens = tuple(find_claimevens(board))
+    baseinverses = tuple(find_baseinverses(board))
+    verticals = tuple(find_verticals(board))
+    # Claimevens and verticals are given by their lower square, their Solutions also hold the one above.
+    return {"claimevens": claimevens,
+        "baseinverses": baseinverses,
+        "verticals": verticals,
+        "claimeven_masks": tuple(squares_masks(((row + 1, col), (row, col))) for row, col in claimevens),
+        "baseinverse_masks": tuple(squares_masks(baseinverse) for baseinverse in baseinverses),
+        "vertical_masks": tuple(squares_masks(((row + 1, col), (row, col))) for row, col in verticals)}
+
+def find_rules(board):
+    """Returns the rule table of board: one lookup instead of scanning the board for every rule."""
+    return rule_table(board_heights(board))
+
 # Helper function for find_befores
 def is_true_befores(board, threat):
     for square in threat:
@@ -237,28 +294,25 @@ def find_befores(board, player="X"):
             "verticals": [((upper_row, upper_col), (lower_row, lower_col)), ...], 
             "claimeven": [((upper_row, upper_col), (lower_row, lower_col)), ...]}
     """
-    if player == "X":
-        opponent = "O"
-    else:
-        opponent = "X"
-    
-    opponent_threats = find_threats(board, opponent)
+    position = from_board(board)
+    empty = BOARD_MASK ^ position.occupied
 
     befores = []
-    for threat in opponent_threats:
-        # If vertical, skip it
-        if (threat[0][0] - threat[1][0]) != 0 and (threat[0][1] - threat[1][1]) == 0:
+    # Before groups are the groups of the opponent, i.e. those without any stone of player.
+    for group_id in alive_group_ids(position.stones[player]):
+        # Verticals can't be before groups
+        if GROUP_DIRECTIONS[group_id] == "vertical":
             continue
-        if is_true_befores(board, threat):
-            # Find all empty square in the threat (before group)
-            empty_squares_of_threat = []
-            for square in threat:
-                if board[square[0]][square[1]] == ".":
-                    empty_squares_of_threat.append(square)
-            # Find all verticals and claimevens in the threat
-            before = add_before_variations(board, threat, empty_squares_of_threat, [], [])
-            if before:
-                befores.append(before)
+        # All empty squares must be below the upper row
+        if GROUP_MASKS[group_id] & empty & TOP_ROW_MASK:
+            continue
+        threat = GROUPS[group_id]
+        # Find all empty square in the threat (before group)
+        empty_squares_of_threat = [square for square in threat if board[square[0]][square[1]] == "."]
+        # Find all verticals and claimevens in the threat
+        before = add_before_variations(board, threat, empty_squares_of_threat, [], [])
+        if before:
+            befores.append(before)
     return befores
 
 # Helper function for special before
@@ -521,4 +575,11 @@ if __name__ == "__main__":
     print("Befores: ", befores)
     print("Special_befores: ", special_befores)
     print("Odd_threats: ", odd_threats)
-    print("Threat_combinations: ", threat_combinations)
\ No newline at end of file
+    print("Threat_combinations: ", threat_combinations)
+
+    start = time.time()
+    table = find_rules(test_diagram)
+    print("Rule table seconds taken: ", time.time() - start)
+    print("Same rules: ", all(list(table[name]) == rules for name, rules in [("claimevens", claimevens),
+        ("baseinverses", baseinverses), ("verticals", verticals)]))
+    print("Rule table cache: ", rule_table.cache_info())
\ No newline at end of file
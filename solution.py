@@ -1,19 +1,41 @@
 from utils import *
 from rules import *
+from bitboard import COLS, mirror_board, player_mask
+from combination import encode_solution
+from groups import GROUPS, GROUP_IDS, MIRROR_GROUP_IDS, SQUARE_TO_GROUP_IDS, alive_group_ids
+from cache import LRUCache, board_key
 
 # ----------- RULES SOLUTIONS ----------- #
 
+# Solutions of the positions seen last, keyed by board_key. The same positions come up
+# again in every game, so the rules are not searched again for them. A board and its
+# mirror image share one entry, stored for the board with the smaller key.
+solutions_cache = LRUCache()
+
 def find_all_solutions(board, player):
     """Finds all solutions the opponent can employ on the board.
+    Results are cached by position and player, the returned lists must not be modified.
 
     Returns:
         List with all solutions. Each solution represented as {squares = [(row, col), ...], groups = [(square1, square2, square3, square4), ...], rule = "rule_name"}
     """
     
-    # Find all rules
-    claimevens = find_claimevens(board)
-    baseinverses = find_baseinverses(board)
-    verticals = find_verticals(board)
+    key, mirrored = board_key(board, player)
+    result = solutions_cache.get(key)
+    if result is None:
+        result = compute_all_solutions(mirror_board(board) if mirrored else board, player)
+        solutions_cache.put(key, result)
+    if mirrored:
+        return mirror_all_solutions(*result)
+    return result
+
+def compute_all_solutions(board, player):
+    """find_all_solutions without the cache."""
+    # Find all rules. Those that only depend on the column heights come from the rule table.
+    rules = find_rules(board)
+    claimevens = zip(rules["claimevens"], rules["claimeven_masks"])
+    baseinverses = zip(rules["baseinverses"], rules["baseinverse_masks"])
+    verticals = zip(rules["verticals"], rules["vertical_masks"])
     #afterevens = find_after_evens(board, player)
     #low_inverses = find_low_inverses(verticals)
     #high_inverses = find_high_inverses(board)
@@ -28,8 +50,8 @@ def find_all_solutions(board, player):
     group_to_solutions = {}
 
     # Find all solutions for all rules
-    for claimeven in claimevens:
-        solution = from_claimeven(claimeven, square_to_groups) # get the solution for each claimeven
+    for claimeven, masks in claimevens:
+        solution = from_claimeven(claimeven, square_to_groups, masks) # get the solution for each claimeven
         if solution:
             solutions.append(solution)
             # Add all solutions to group_to_solutions
@@ -38,8 +60,8 @@ def find_all_solutions(board, player):
                     group_to_solutions[group] = []
                 group_to_solutions[group].append(solution) # group_to_solutions--> Dict: key=group, value={squares,groups,rule}
 
-    for baseinverse in baseinverses:
-        solution = from_baseinverse(baseinverse, square_to_groups)
+    for baseinverse, masks in baseinverses:
+        solution = from_baseinverse(baseinverse, square_to_groups, masks)
         if solution:
             solutions.append(solution)
             # Add all solutions to group_to_solutions
@@ -48,8 +70,8 @@ def find_all_solutions(board, player):
                     group_to_solutions[group]=[]
                 group_to_solutions[group].append(solution)
 
-    for vertical in verticals:
-        solution = from_vertical(vertical,square_to_groups)
+    for vertical, masks in verticals:
+        solution = from_vertical(vertical, square_to_groups, masks)
         if solution:
             solutions.append(solution)
             for group in solution["groups"]:
@@ -76,21 +98,48 @@ def find_all_solutions(board, player):
 
 # -------- HELPER FUNCTIONS FOR RULES SOLUTIONS -------- #
 
+def mirror_square(square):
+    return (square[0], COLS - 1 - square[1])
+
+def mirror_group(group):
+    """Returns the mirror image of a group, as listed in GROUPS."""
+    if group in GROUP_IDS:
+        return GROUPS[MIRROR_GROUP_IDS[GROUP_IDS[group]]]
+    return tuple(mirror_square(square) for square in group)
+
+def mirror_solution(solution):
+    """Returns the Solution for the mirror image of the board solution was found on."""
+    squares = solution["squares"]
+    groups = solution["groups"]
+    mirrored = {"squares": type(squares)(mirror_square(square) for square in squares),
+        "groups": type(groups)(mirror_group(group) for group in groups)}
+    for pairs in ("verticals", "claimevens"):
+        if pairs in solution:
+            mirrored[pairs] = [tuple(mirror_square(square) for square in pair) for pair in solution[pairs]]
+    mirrored["rule"] = solution["rule"]
+    return encode_solution(mirrored)
+
+def mirror_all_solutions(solutions, group_to_solutions):
+    """Returns the result of find_all_solutions for the mirror image of the board."""
+    mirrored = {id(solution): mirror_solution(solution) for solution in solutions}
+    return ([mirrored[id(solution)] for solution in solutions],
+        {mirror_group(group): [mirrored[id(solution)] for solution in group_solutions] for group, group_solutions in group_to_solutions.items()})
+
 def find_square_to_groups(board, player):
     """Returns:
         Dictionary with all squares as keys and all threats that contain that square as values.
         Format: {(row, col): [(square1, square2, square3, square4), ...]}
     """
-    square_to_group={}
-    threats = find_threats(board, player)
-    for group in threats:
-        for coord in group:
-            if coord not in square_to_group:
-                square_to_group[coord] = []
-            square_to_group[coord].append(group)
+    opponent = "O" if player == "X" else "X"
+    alive = set(alive_group_ids(player_mask(board, opponent)))
+    square_to_group = {}
+    for square, group_ids in SQUARE_TO_GROUP_IDS.items():
+        groups = [GROUPS[group_id] for group_id in group_ids if group_id in alive]
+        if groups:
+            square_to_group[square] = groups
     return square_to_group
 
-def from_claimeven(claimeven, square_to_groups):
+def from_claimeven(claimeven, square_to_groups, masks=None):
     """Converts a claimeven into a Solution.
     Returns:
     - Squares: upper an lower square
@@ -105,9 +154,9 @@ def from_claimeven(claimeven, square_to_groups):
     if upper_square in square_to_groups:
         groups = square_to_groups[upper_square] # Find threats on the upper square
         if groups: # Must solve a group in order to be converted into a solution
-            return {"squares": ((upper_square, lower_square)), "groups": groups, "rule":rule}
+            return encode_solution({"squares": ((upper_square, lower_square)), "groups": groups, "rule":rule}, masks)
 
-def from_baseinverse(baseinverse, square_to_groups):
+def from_baseinverse(baseinverse, square_to_groups, masks=None):
     """Converts a Baseinverse into a Solution if there is one.
     Returns:
         solution = {"squares": ((square1, square2)), "groups": [(square1, square2, square3, square4)], "rule": rule}
@@ -119,9 +168,9 @@ def from_baseinverse(baseinverse, square_to_groups):
         groups1, groups2 = square_to_groups[square1], square_to_groups[square2]
         groups_intersection = intersection(groups1, groups2)
         if groups_intersection:
-            return {"squares": (square1, square2), "groups": groups_intersection, "rule": "baseinverse"}
+            return encode_solution({"squares": (square1, square2), "groups": groups_intersection, "rule": "baseinverse"}, masks)
 
-def from_vertical(vertical,square_to_groups):
+def from_vertical(vertical, square_to_groups, masks=None):
     '''Converts a vertical to a solution.
     Args: vertical: tuple with the coordinates of the lower square
     square_to_groups: dictionary with the groups of each square
@@ -133,7 +182,7 @@ def from_vertical(vertical,square_to_groups):
         lower_groups = square_to_groups[(vertical[0]+1,vertical[1])] # Upper vertical square
         groups_intersection = intersection(upper_groups,lower_groups)
         if groups_intersection:
-            return {"squares": ((vertical[0]+1,vertical[1]), vertical), "groups":groups_intersection,"rule":"vertical"}
+            return encode_solution({"squares": ((vertical[0]+1,vertical[1]), vertical), "groups":groups_intersection,"rule":"vertical"}, masks)
 
 def from_before(board, before, square_to_groups):
     """Converts before into a Solution.
@@ -193,7 +242,7 @@ def from_before(board, before, square_to_groups):
                 set(threats).update(claimeven_solution["groups"])
 
 
-        return {"squares": squares, "verticals": verticals, "claimevens": claimevens, "groups": threats, "rule": "before"}
+        return encode_solution({"squares": squares, "verticals": verticals, "claimevens": claimevens, "groups": threats, "rule": "before"})
 
 
 
@@ -248,7 +297,7 @@ def from_odd_threat(board, odd_threat, square_to_groups):
         square = (row, odd_threat["empty_odd_square"][1])
         groups_solved.append(square)
     
-    return {"squares": [odd_threat["empty_odd_square"]], "groups": groups_solved, "rule": "odd_threat"}
+    return encode_solution({"squares": [odd_threat["empty_odd_square"]], "groups": groups_solved, "rule": "odd_threat"})
 
 
 
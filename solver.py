@@ -0,0 +1,214 @@
+import time
+
+from bitboard import BOARD_MASK, BOTTOM_MASK, COLS, COLUMN_MASKS, ROWS, Position, from_board, mirror_mask, to_board, winning_squares
+from minimax import CENTER_ORDER, SearchTimeout
+from transposition import LOWER, UPPER, TranspositionTable
+
+# ----------- PERFECT PLAY SOLVER ----------- #
+# Exact negamax over two bitboards: current, the stones of the player to move, and mask, all the
+# stones. Scores count how early the game is won: a win with the last stone of the player to
+# move scores 1, and a win with n of its stones left to play scores n + 1. Losses are negative
+# and a draw scores 0.
+#
+# The search only ever looks at a score window of width 1 (null window): solve narrows the
+# score down with a binary search of such windows. Moves that let the opponent win right away
+# are never generated, and positions where the player to move can win at once are never
+# searched, so the tree stops one ply before the end of every lost line.
+
+SIZE = ROWS * COLS
+
+# Positions up to this number of stones share a table entry with their mirror image. Later on
+# symmetric positions are rare and the mirrored key is not worth computing.
+MIRROR_MOVES = 12
+
+TABLE_SIZE = 1 << 18
+
+
+def possible_moves(mask):
+    """Returns a mask with the playable square of every column that is not full."""
+    return (mask + BOTTOM_MASK) & BOARD_MASK
+
+
+def non_losing_moves(current, mask):
+    """Returns the playable squares that do not let the opponent win at once, or 0 if every move loses."""
+    possible = possible_moves(mask)
+    opponent_wins = winning_squares(current ^ mask, mask)
+    forced = possible & opponent_wins
+    if forced:
+        if forced & (forced - 1):
+            return 0 # Two immediate threats of the opponent: nothing stops both.
+        possible = forced
+    # Do not play under a square that wins for the opponent.
+    return possible & ~(opponent_wins >> 1)
+
+
+def move_score(current, mask, move):
+    """Returns the number of winning squares of the player to move after playing move."""
+    return bin(winning_squares(current | move, mask | move)).count("1")
+
+
+def ordered_moves(current, mask, possible, hash_move=None):
+    """Returns (column, move) for the moves in possible: most winning squares first, then the
+    hash move, then the central columns."""
+    ordered = []
+    for rank, col in enumerate(CENTER_ORDER):
+        move = possible & COLUMN_MASKS[col]
+        if move:
+            ordered.append((move_score(current, mask, move), col == hash_move, -rank, col, move))
+    if len(ordered) > 1:
+        ordered.sort(reverse=True)
+    return [(col, move) for _, _, _, col, move in ordered]
+
+
+class Solver:
+    """Exact negamax with a transposition table of score bounds.
+
+    Args:
+        table: TranspositionTable, kept between solves so later positions of a game reuse the
+            bounds found earlier.
+        deadline: time.time() at which a solve gives up with SearchTimeout, None for no limit.
+    """
+
+    def __init__(self, table=None, deadline=None):
+        self.table = table if table is not None else TranspositionTable(TABLE_SIZE)
+        self.deadline = deadline
+        self.nodes = 0
+
+    def negamax(self, current, mask, moves, alpha, beta):
+        """Returns the score of a position where the player to move cannot win at once.
+
+        The result is exact inside (alpha, beta), an upper bound if at most alpha and a lower
+        bound if at least beta.
+        """
+        self.nodes += 1
+        if self.deadline is not None and self.nodes & 1023 == 0 and time.time() >= self.deadline:
+            raise SearchTimeout()
+
+        possible = non_losing_moves(current, mask)
+        if possible == 0:
+            return -((SIZE - moves) // 2) # The opponent wins with its next stone.
+        if moves >= SIZE - 2:
+            return 0 # Draw: neither player can win with the last two stones.
+
+        low = -((SIZE - 2 - moves) // 2) # The opponent cannot win before its second next stone.
+        if alpha < low:
+            alpha = low
+            if alpha >= beta:
+                return alpha
+        high = (SIZE - 1 - moves) // 2 # No win with the next stone either.
+
+        key = current + mask
+        mirrored = False
+        if moves <= MIRROR_MOVES:
+            mirrored_key = mirror_mask(key)
+            if mirrored_key < key:
+                key = mirrored_key
+                mirrored = True
+        hash_move = None
+        entry = self.table.probe(key)
+        if entry is not None:
+            _, score, flag, _, hash_move = entry
+            if mirrored and hash_move is not None:
+                hash_move = COLS - 1 - hash_move
+            if flag == UPPER:
+                if score < high:
+                    high = score
+            elif score > alpha:
+                alpha = score
+                if alpha >= beta:
+                    return alpha
+        if beta > high:
+            beta = high
+            if alpha >= beta:
+                return beta
+
+        # Positions with more empty squares have larger subtrees: they keep the depth-preferred slot.
+        priority = SIZE - moves
+        opponent = current ^ mask
+        for col, move in ordered_moves(current, mask, possible, hash_move):
+            score = -self.negamax(opponent, mask | move, moves + 1, -beta, -alpha)
+            if score >= beta:
+                self.table.store(key, score, LOWER, priority, COLS - 1 - col if mirrored else col)
+                return score
+            if score > alpha:
+                alpha = score
+        self.table.store(key, alpha, UPPER, priority, None)
+        return alpha
+
+
+solver_table = TranspositionTable(TABLE_SIZE)
+
+
+def solve(board, player, table=None, deadline=None, stats=None):
+    """Solves a position exactly.
+
+    Args:
+        board: flipped board (row 0 at the bottom) on which nobody has won yet.
+        player: player to move.
+        table: transposition table of the search, a table kept between calls if None.
+        deadline: time.time() at which to give up with minimax.SearchTimeout.
+        stats: optional dictionary, filled with the number of nodes and null window searches.
+    Returns:
+        (score, column): the game-theoretic value for player (positive for a win, negative for
+        a loss, 0 for a draw, larger the earlier the game ends) and a column reaching it.
+    """
+    position = from_board(board)
+    if position.moves == SIZE:
+        raise ValueError("The board is full")
+    current, mask, moves = position.stones[player], position.occupied, position.moves
+    searcher = Solver(table if table is not None else solver_table, deadline)
+    if stats is not None:
+        stats["nodes"] = 0
+        stats["searches"] = 0
+
+    possible = possible_moves(mask)
+    wins = winning_squares(current, mask) & possible
+    for col in CENTER_ORDER:
+        if wins & COLUMN_MASKS[col]:
+            return (SIZE + 1 - moves) // 2, col
+    if not non_losing_moves(current, mask):
+        # Every move loses at once: play in the first column that is not full.
+        col = next(col for col in CENTER_ORDER if possible & COLUMN_MASKS[col])
+        return -((SIZE - moves) // 2), col
+
+    low = -((SIZE - moves) // 2)
+    high = (SIZE + 1 - moves) // 2
+    try:
+        while low < high:
+            # Try the middle of the window first, but the values closer to 0 when it is wide.
+            middle = low + (high - low) // 2
+            if middle <= 0 and int(low / 2) < middle:
+                middle = int(low / 2)
+            elif middle >= 0 and int(high / 2) > middle:
+                middle = int(high / 2)
+            score = searcher.negamax(current, mask, moves, middle, middle + 1)
+            if stats is not None:
+                stats["searches"] += 1
+            if score <= middle:
+                high = score
+            else:
+                low = score
+
+        # A move reaching the score: the child is worth at most -low for the opponent. The
+        # bounds stored by the searches above make these searches short.
+        for col, move in ordered_moves(current, mask, non_losing_moves(current, mask)):
+            if searcher.negamax(current ^ mask, mask | move, moves + 1, -low, -low + 1) <= -low:
+                return low, col
+    finally:
+        if stats is not None:
+            stats["nodes"] = searcher.nodes
+    raise AssertionError("No move reaches the score %d" % low)
+
+
+if __name__ == "__main__":
+    # TESTING
+    for sequence in ("14413232332332142244", "404032333623322224", "63243333321222211144"):
+        position = Position()
+        player = "X"
+        for col in sequence:
+            position.play(int(col), player)
+            player = "O" if player == "X" else "X"
+        stats = {}
+        start = time.time()
+        score, col = solve(to_board(position), player, stats=stats)
+        print(sequence, player, "score", score, "column", col, stats, "%.2fs" % (time.time() - start))
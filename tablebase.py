@@ -0,0 +1,233 @@
+import argparse
+import mmap
+import os
+import random
+import struct
+import sys
+import time
+
+from bitboard import COLS, ROWS, Position, from_board, other_player
+from cache import position_key
+from minimax import CENTER_ORDER
+
+# ----------- ENDGAME TABLEBASE FILE ----------- #
+# Header: magic, version, the largest number of empty squares of the positions and the number of
+# records. Records: 7 bytes, little endian, holding the canonical position key (see
+# cache.position_key) shifted left by 2 and the value of the position for the player to move
+# in the 2 low bits. Sorting the records sorts the keys, so that a lookup is a binary search on
+# the memory-mapped file. A position and its mirror image share one record, as they have the
+# same value.
+
+MAGIC = b"C4TB"
+VERSION = 1
+HEADER = struct.Struct("<4sHBxI")
+RECORD_SIZE = 7
+
+# Values, for the player to move.
+LOSS = 0
+DRAW = 1
+WIN = 2
+
+SIZE = ROWS * COLS
+
+TABLEBASE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tablebase.bin")
+
+
+class Tablebase:
+    """Read-only view of a tablebase file."""
+
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.empties, self.count = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError("not a tablebase file:", path)
+
+    def __len__(self):
+        return self.count
+
+    def record_at(self, index):
+        offset = HEADER.size + index * RECORD_SIZE
+        return int.from_bytes(self.data[offset:offset + RECORD_SIZE], "little")
+
+    def lookup(self, key):
+        """Returns the value (LOSS, DRAW or WIN) stored for key, or None."""
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self.record_at(middle) >> 2 < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.count:
+            record = self.record_at(low)
+            if record >> 2 == key:
+                return record & 3
+        return None
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+
+def write_tablebase(path, values, empties):
+    """Writes a tablebase file from a dictionary {key: value}."""
+    with open(path, "wb") as tablebase_file:
+        tablebase_file.write(HEADER.pack(MAGIC, VERSION, empties, len(values)))
+        for key in sorted(values):
+            tablebase_file.write((key << 2 | values[key]).to_bytes(RECORD_SIZE, "little"))
+
+
+# ----------- LOOKUP FROM PLAY ----------- #
+
+_tablebase = None
+_tablebase_checked = False
+
+
+def get_tablebase(path=TABLEBASE_PATH):
+    """Returns the default tablebase, or None if there is no tablebase file."""
+    global _tablebase, _tablebase_checked
+    if not _tablebase_checked:
+        _tablebase_checked = True
+        if os.path.exists(path):
+            _tablebase = Tablebase(path)
+    return _tablebase
+
+
+def probe(board, player):
+    """Returns the best column for a flipped board with player to move, or None if the position
+    is not in the tablebase. Wins are played first, then draws."""
+    tablebase = get_tablebase()
+    if tablebase is None:
+        return None
+    position = from_board(board)
+    if SIZE - position.moves > tablebase.empties or tablebase.lookup(position_key(position, player)[0]) is None:
+        return None
+    columns = [col for col in CENTER_ORDER if position.can_play(col)]
+    for col in columns:
+        if position.is_winning_move(col, player):
+            return col
+    # The children of a position of the tablebase are in it too, unless the file is damaged.
+    opponent = other_player(player)
+    best_col, best_value = None, -1
+    for col in columns:
+        position.play(col, player)
+        if position.is_full():
+            value = DRAW
+        else:
+            value = tablebase.lookup(position_key(position, opponent)[0])
+            if value is None:
+                return None
+            value = WIN - value
+        position.undo(col)
+        if value > best_value:
+            best_col, best_value = col, value
+    return best_col
+
+
+# ----------- TABLEBASE GENERATOR ----------- #
+
+def solve_all(position, player, values):
+    """Solves position and all its descendants exhaustively.
+
+    values: {key: value} of the positions solved so far, filled with position and its descendants.
+    Returns:
+        The value of position for player.
+    """
+    key, _ = position_key(position, player)
+    value = values.get(key)
+    if value is not None:
+        return value
+    # Every child is solved, even after a win is found, so that the tablebase also answers
+    # after a mistake of either player.
+    opponent = other_player(player)
+    value = LOSS
+    for col in range(COLS):
+        if not position.can_play(col):
+            continue
+        if position.is_winning_move(col, player):
+            value = WIN
+            continue
+        position.play(col, player)
+        child = DRAW if position.is_full() else WIN - solve_all(position, opponent, values)
+        position.undo(col)
+        value = max(value, child)
+    values[key] = value
+    return value
+
+
+def play_sequence(sequence, empties, first_player="X"):
+    """Plays the columns of sequence until empties squares are left.
+
+    Returns:
+        (position, player to move), or None if the game ends or the sequence is too short.
+    """
+    position = Position()
+    player = first_player
+    for col in sequence:
+        if SIZE - position.moves == empties:
+            break
+        if not 0 <= col < COLS or not position.can_play(col):
+            return None
+        position.play(col, player)
+        if position.has_won(player):
+            return None
+        player = other_player(player)
+    if SIZE - position.moves != empties:
+        return None
+    return position, player
+
+
+def random_seeds(games, empties, seed=1, first_player="X"):
+    """Returns positions with empties empty squares reached by games random games without a win."""
+    rng = random.Random(seed)
+    seeds = []
+    while len(seeds) < games:
+        sequence = []
+        heights = [0] * COLS
+        while len(sequence) < SIZE - empties:
+            col = rng.choice([col for col in range(COLS) if heights[col] < ROWS])
+            heights[col] += 1
+            sequence.append(col)
+        seed_position = play_sequence(sequence, empties, first_player)
+        if seed_position is not None:
+            seeds.append(seed_position)
+    return seeds
+
+
+def build_tablebase(path, seeds, empties):
+    """Solves every position reachable from the seeds and writes the tablebase to path.
+
+    Every position with at most empties empty squares cannot be enumerated, so the tablebase
+    covers the positions reachable from seeds, positions with empties empty squares.
+    """
+    values = {}
+    start = time.time()
+    for i, (position, player) in enumerate(seeds):
+        solve_all(position, player, values)
+        if (i + 1) % 100 == 0:
+            print("%d/%d seeds, %d positions, %.0fs" % (i + 1, len(seeds), len(values), time.time() - start))
+    write_tablebase(path, values, empties)
+    return len(values)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Builds the endgame tablebase consulted by play.play.")
+    parser.add_argument("--empties", type=int, default=12, help="empty squares of the seed positions")
+    parser.add_argument("--games", type=int, default=500, help="random games played to get seed positions")
+    parser.add_argument("--sequences", help="file with one game per line, as the columns played (e.g. 3323...), used as seeds instead of random games")
+    parser.add_argument("--seed", type=int, default=1, help="seed of the random games")
+    parser.add_argument("--first-player", default="X", choices=["X", "O"])
+    parser.add_argument("--output", default=TABLEBASE_PATH)
+    args = parser.parse_args()
+    if args.sequences:
+        with open(args.sequences) as sequences:
+            seeds = [play_sequence([int(col) for col in line.strip()], args.empties, args.first_player) for line in sequences if line.strip()]
+        seeds = [seed_position for seed_position in seeds if seed_position is not None]
+    else:
+        seeds = random_seeds(args.games, args.empties, args.seed, args.first_player)
+    if not seeds:
+        sys.exit("No seed position with %d empty squares" % args.empties)
+    count = build_tablebase(args.output, seeds, args.empties)
+    print("Wrote %d positions to %s" % (count, args.output))
@@ -0,0 +1,195 @@
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from bitboard import COLS, Position, other_player, to_board
+from utils import board_flip
+from benchmark import summarize
+from cache import LRUCache
+from rules import rule_table
+from transposition import TranspositionTable
+import play
+import solution
+import solver
+import victor
+
+# ----------- LOCAL SELF-PLAY TOURNAMENT ----------- #
+# Engine configurations play each other on a process pool, every game starting from an opening
+# drawn from OPENINGS and played once with each configuration moving first. Boards are given
+# to the engines as the server sends them: top row first, with the board of the previous
+# turn of the player, before the opponent moved.
+
+# Seed openings, as the columns played from the empty board.
+OPENINGS = [(), (3,), (2,), (4,), (1,), (3, 3), (3, 2), (3, 4), (3, 1), (3, 5), (2, 3), (2, 4), (4, 3),
+    (3, 3, 3), (3, 3, 2), (3, 3, 4), (3, 2, 3), (3, 4, 3), (3, 2, 2), (3, 4, 4), (3, 3, 3, 3)]
+
+# Built-in configurations: play.play arguments, or "random" for a random legal move.
+CONFIGS = {"fast": {"time_budget": 0.05}, "default": {"time_budget": 0.2}, "solver": {"time_budget": 0.5, "mode": "solver"},
+    "random": "random"}
+
+
+# Tables the engine keeps between moves, as {name: module}. Every configuration of a game gets
+# its own, so that no configuration reuses the searches of its opponent.
+ENGINE_TABLES = {"transposition_table": play, "solver_table": solver, "solutions_cache": solution, "evaluate_cache": victor}
+
+
+def new_engine_tables():
+    """Returns empty tables for one configuration, of the sizes of the module tables."""
+    return {"transposition_table": TranspositionTable(play.transposition_table.size),
+        "solver_table": TranspositionTable(solver.solver_table.size),
+        "solutions_cache": LRUCache(solution.solutions_cache.maxsize),
+        "evaluate_cache": LRUCache(victor.evaluate_cache.maxsize)}
+
+
+def use_engine_tables(tables):
+    """Makes the engine use tables, returns the tables it was using."""
+    previous = {name: getattr(module, name) for name, module in ENGINE_TABLES.items()}
+    for name, module in ENGINE_TABLES.items():
+        setattr(module, name, tables[name])
+    return previous
+
+
+def engine_move(config, previous_board, board, player, rng):
+    """Returns the column chosen by an engine configuration, with its prints suppressed."""
+    if config == "random":
+        return rng.choice([col for col in range(COLS) if board[0][col] == "."])
+    with contextlib.redirect_stdout(io.StringIO()):
+        return play.play(previous_board, board, player, **config)
+
+
+def play_game(configs, names, opening, seed):
+    """Plays one game between two configurations in a worker.
+
+    Args:
+        configs: {name: configuration}.
+        names: {"X": name, "O": name}, X moves first.
+        opening: columns played before the engines take over.
+    Returns:
+        Dictionary with the winner ("X", "O" or None for a draw), the number of moves, the
+        latencies of every move by configuration and whether the game ended on an illegal move.
+    """
+    rng = random.Random(seed)
+    position = Position()
+    player = "X"
+    for col in opening:
+        position.play(col, player)
+        player = other_player(player)
+    # Board of the previous turn of every player, in the format of the server.
+    previous_boards = {"X": board_flip(to_board(position)), "O": board_flip(to_board(position))}
+    latencies = {name: [] for name in names.values()}
+    tables = {"X": new_engine_tables(), "O": new_engine_tables()}
+    # The rule table only depends on the column heights and is shared by both configurations,
+    # as in real play by the engine, but it does not carry over from the previous game.
+    rule_table.cache_clear()
+    module_tables = use_engine_tables(tables[player])
+    try:
+        return play_moves(configs, names, position, player, previous_boards, latencies, tables, rng)
+    finally:
+        use_engine_tables(module_tables)
+
+
+def play_moves(configs, names, position, player, previous_boards, latencies, tables, rng):
+    """Plays the game of play_game until its end, with the tables of the player to move."""
+    while True:
+        board = board_flip(to_board(position))
+        use_engine_tables(tables[player])
+        start = time.perf_counter()
+        col = engine_move(configs[names[player]], previous_boards[player], board, player, rng)
+        latencies[names[player]].append(time.perf_counter() - start)
+        previous_boards[player] = board
+        if col is None or not 0 <= col < COLS or not position.can_play(col):
+            return {"winner": other_player(player), "moves": position.moves, "latencies": latencies, "illegal": True}
+        position.play(col, player)
+        if position.has_won(player):
+            return {"winner": player, "moves": position.moves, "latencies": latencies, "illegal": False}
+        if position.is_full():
+            return {"winner": None, "moves": position.moves, "latencies": latencies, "illegal": False}
+        player = other_player(player)
+
+
+def schedule(names, openings_per_pair, seed):
+    """Returns the games to play: every pair of configurations (a configuration plays itself if
+    there is only one) on openings_per_pair openings, once with each configuration as X."""
+    rng = random.Random(seed)
+    pairs = list(itertools.combinations(names, 2)) or [(names[0], names[0])]
+    games = []
+    for first, second in pairs:
+        for opening in rng.sample(OPENINGS, min(openings_per_pair, len(OPENINGS))):
+            games.append(({"X": first, "O": second}, opening))
+            games.append(({"X": second, "O": first}, opening))
+    return games
+
+
+def tournament(configs, openings_per_pair=4, workers=None, seed=1):
+    """Plays the tournament on a process pool.
+
+    Returns:
+        Report with the number of games, games per second and, for every configuration, its
+        wins, draws, losses, illegal moves and move latency statistics. In self-play the
+        results are those of the configuration moving first.
+    """
+    games = schedule(list(configs), openings_per_pair, seed)
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(play_game, configs, names, opening, seed + i) for i, (names, opening) in enumerate(games)]
+        results = [future.result() for future in futures]
+    elapsed = time.perf_counter() - start
+
+    scores = {name: {"wins": 0, "draws": 0, "losses": 0, "illegal": 0} for name in configs}
+    latencies = {name: [] for name in configs}
+    for (names, _), result in zip(games, results):
+        for player, name in names.items():
+            if names["X"] == names["O"] and player == "O":
+                break # Self-play: count the game once.
+            if result["winner"] is None:
+                scores[name]["draws"] += 1
+            elif result["winner"] == player:
+                scores[name]["wins"] += 1
+            else:
+                scores[name]["losses"] += 1
+                scores[name]["illegal"] += result["illegal"]
+        for name, times in result["latencies"].items():
+            latencies[name].extend(times)
+
+    return {"games": len(games),
+        "seconds": elapsed,
+        "games_per_second": len(games) / elapsed if elapsed else 0.0,
+        "moves": sum(result["moves"] for result in results),
+        "configs": {name: dict(scores[name], latency=summarize(latencies[name])) for name in configs}}
+
+
+def parse_config(text):
+    """Parses a configuration given as name=time_budget or name=random."""
+    name, _, value = text.partition("=")
+    if not value:
+        return name, CONFIGS[name]
+    if value == "random":
+        return name, "random"
+    return name, {"time_budget": float(value)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Plays engine configurations against each other on a process pool.")
+    parser.add_argument("configs", nargs="*", default=["fast", "random"],
+        help="configurations: a built-in name (%s), name=time_budget or name=random" % ", ".join(CONFIGS))
+    parser.add_argument("--openings", type=int, default=4, help="openings for every pair of configurations")
+    parser.add_argument("--workers", type=int, help="worker processes, one per CPU by default")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="file to write the JSON report to")
+    args = parser.parse_args()
+
+    configs = dict(parse_config(text) for text in args.configs)
+    report = tournament(configs, args.openings, args.workers, args.seed)
+    print("%d games in %.1fs, %.2f games/s" % (report["games"], report["seconds"], report["games_per_second"]))
+    for name, result in report["configs"].items():
+        latency = result["latency"]
+        print("%-10s W %3d  D %3d  L %3d  move median %7.1f ms  p90 %7.1f ms  p99 %7.1f ms" % (name,
+            result["wins"], result["draws"], result["losses"], latency.get("median_ms", 0), latency.get("p90_ms", 0), latency.get("p99_ms", 0)))
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
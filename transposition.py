@@ -0,0 +1,85 @@
+# ----------- TRANSPOSITION TABLE ----------- #
+
+# Bound types of a stored score.
+EXACT = 0
+LOWER = 1 # The real score is at least the stored score (fail high).
+UPPER = 2 # The real score is at most the stored score (fail low).
+
+DEFAULT_SIZE = 1 << 16
+
+
+class TranspositionTable:
+    """Fixed-size table of search results keyed by a Zobrist hash.
+
+    Every bucket has two slots: a depth-preferred slot that only gets replaced by a search
+    at least as deep, and an always-replace slot that takes everything else. The table
+    never grows, so memory stays flat however long the process runs.
+
+    Entries are tuples (key, score, flag, depth, move).
+    """
+
+    def __init__(self, size=DEFAULT_SIZE):
+        if size <= 0 or size & (size - 1):
+            raise ValueError("size must be a power of two:", size)
+        self.size = size
+        self.mask = size - 1
+        self.deep = [None] * size
+        self.always = [None] * size
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0 # Misses where the bucket was holding other positions.
+        self.stores = 0
+
+    def probe(self, key):
+        """Returns the entry stored for key, or None."""
+        index = key & self.mask
+        entry = self.deep[index]
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry
+        other = self.always[index]
+        if other is not None and other[0] == key:
+            self.hits += 1
+            return other
+        self.misses += 1
+        if entry is not None or other is not None:
+            self.collisions += 1
+        return None
+
+    def store(self, key, score, flag, depth, move):
+        """Stores a search result, following the depth-preferred/always-replace policy."""
+        index = key & self.mask
+        entry = (key, score, flag, depth, move)
+        self.stores += 1
+        deep = self.deep[index]
+        if deep is None or deep[0] == key or depth >= deep[3]:
+            self.deep[index] = entry
+            # Do not keep a stale copy of the same position in the other slot.
+            other = self.always[index]
+            if other is not None and other[0] == key:
+                self.always[index] = None
+        else:
+            self.always[index] = entry
+
+    def clear(self):
+        self.deep = [None] * self.size
+        self.always = [None] * self.size
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0
+        self.stores = 0
+
+    def stats(self):
+        """Returns the counters used to size the table."""
+        filled = sum(1 for entry in self.deep if entry is not None) + sum(1 for entry in self.always if entry is not None)
+        probes = self.hits + self.misses
+        return {"size": self.size,
+            "filled": filled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "collisions": self.collisions,
+            "stores": self.stores,
+            "hit_rate": self.hits / probes if probes else 0.0}
@@ -1,6 +1,8 @@
 # ----------- HELPER FUNCTIONS ----------- #
 
 from copy import deepcopy
+from bitboard import from_board, player_mask, winning_squares
+from groups import GROUPS, alive_group_ids
 
 def update_board(board, col, player):
     """Updates a board with a new move.
@@ -28,9 +30,7 @@ def board_flip(board):
     """Returns a new board with the board flipped vertically.
     This allows accessing the lower row as the first item in the list."""
 
-    new_board = deepcopy(board)
-    new_board.reverse()
-    return new_board
+    return [row[:] for row in reversed(board)]
 
 def possible_actions(board):
     """Returns a list of all directly playable actions (row, col) on a board."""
@@ -69,61 +69,14 @@ def is_true_threat(threat):
     return False
 
 def find_threats(board, player):
-    groups = []
-    # first we need to find the possible groups in the board
-    
-    # Check for vertical
-    for i in range(3):
-        for j in range(7):
-            if board[i][j] == player or board[i][j]== ".":
-                if board[i+1][j] == player or board[i+1][j]== ".":
-                    if board[i+2][j] == player or board[i+2][j]== ".":
-                        if board[i+3][j] == player or board[i+3][j]== ".":
-                            groups.append(((i,j),(i+1,j),(i+2,j),(i+3,j)))
-    
-    # Check for horizontal
-    for i in range(6):
-        for j in range(4):
-            if board[i][j] == player or board[i][j]== ".":
-                if board[i][j+1] == player or board[i][j+1]== ".":
-                    if board[i][j+2] == player or board[i][j+2]== ".":
-                        if board[i][j+3] == player or board[i][j+3]== ".":
-                            groups.append(((i,j),(i,j+1),(i,j+2),(i,j+3)))
-
-    # Check for diagonal right
-    for i in range(3):
-        for j in range(4):
-            if board[i][j] == player or board[i][j]== ".":
-                if board[i+1][j+1] == player or board[i+1][j+1]== ".":
-                    if board[i+2][j+2] == player or board[i+2][j+2]== ".":
-                        if board[i+3][j+3] == player or board[i+3][j+3]== ".":
-                            groups.append(((i,j),(i+1,j+1),(i+2,j+2),(i+3,j+3)))
-    # Check for diagonal left
-    for i in range(3):
-        for j in range(3,7):
-            if board[i][j] == player or board[i][j]== ".":
-                if board[i+1][j-1] == player or board[i+1][j-1]== ".":
-                    if board[i+2][j-2] == player or board[i+2][j-2]== ".":
-                        if board[i+3][j-3] == player or board[i+3][j-3]== ".":
-                            groups.append(((i,j),(i+1,j-1),(i+2,j-2),(i+3,j-3)))
-    return groups
+    """Returns all groups that player can still complete, i.e. without any opponent stone."""
+    opponent = "O" if player == "X" else "X"
+    return [GROUPS[group_id] for group_id in alive_group_ids(player_mask(board, opponent))]
 
 def find_strong_threat(board, player):
-    # Finds threats with 3 of the player's pieces and 1 empty space
-    opponent_threats = find_threats(board, player)
-    playable_actions = possible_actions(board)
-    for threat in opponent_threats:
-        tokens = 0
-        empty_squares = 0
-        for square in threat:
-            if board[square[0]][square[1]] == player:
-                tokens += 1
-            if board[square[0]][square[1]] == '.' and square in playable_actions:
-                empty_squares += 1
-        if tokens == 3 and empty_squares == 1:
-            return True
-
-    return False
+    # Finds threats with 3 of the player's pieces and 1 empty space that is directly playable
+    position = from_board(board)
+    return winning_squares(position.stones[player], position.occupied) & position.playable_mask() != 0
 
 def stop_threat(board, player):
     # Finds threats with 3 of the player's pieces and 1 empty space
@@ -1,96 +1,166 @@
+import time
 from utils import *
 from rules import *
 from combination import combination_allowed
-from solution import find_all_solutions, find_all_win_conditions
+from cover import find_cover
+from cache import LRUCache, board_key
+from bitboard import COLUMN_MASKS, mirror_board
+from groups import GROUP_IDS
+from solution import find_all_solutions, find_all_win_conditions, mirror_solution
 
 
-def find_chosen_set(node_graph, problems, disallowed_solutions, used_solutions, num_not_solutions):
-    """Finds a set of Solutions that solves all Problems.
+def hashable_solution(solution):
+    """Returns the key of a Solution in the node graph."""
+    return (solution["rule"], tuple(solution["groups"]), tuple(solution["squares"]))
+
+
+def find_chosen_set(node_graph, problems, stats=None, max_nodes=None):
+    """Finds a set of Solutions that solves all Problems, in which every two Solutions can be combined.
+
+    The search runs on the exact cover solver of cover.py: every Problem has to be solved by at
+    least one chosen Solution and the Solutions connected in node_graph exclude each other.
+    Problems that no Solution solves are left out, as they can never be solved.
     Args:
         node_graph: a Dictionary of groups or Solutions to all Solutions they are connected to.
-        problems: a set of groups that need to be solved.
-        solutions: a set of Solutions available to solve problems.
-        used_solutions: a set of Solutions that have already been used to solve problems outside problems.
+        problems: an iterable of groups that need to be solved.
+        stats: optional dictionary, filled with the number of Problems that can be solved and
+            the nodes explored and backtracks of the search.
+        max_nodes: optional limit on the nodes explored.
     Returns:
-        chosen_set: a set of Solutions that solves all Problems, if it exists...
+        chosen_set: a list of Solutions that solves all Problems, or [] if there is none.
     """
-    # If there are no more Problems, we have found a set of Solutions.
-    if len(problems) == 0:
-        #print("Eureka!")
-        return used_solutions.copy()
-    if len(problems) <= num_not_solutions:
-        #print("Eureka2!")
-        return used_solutions.copy()
-    #print("Problems", len(problems))
-    # Recursive case
-    #print(len(problems), num_not_solutions)
-    most_difficult_node = node_with_least_number_of_neighbors(node_graph, problems, disallowed_solutions)
-    most_difficult_node_usable_solutions = node_graph[most_difficult_node]
-    for solution in disallowed_solutions:
-        if solution in most_difficult_node_usable_solutions:
-            most_difficult_node_usable_solutions.remove(solution)
-    
-    for solution in most_difficult_node_usable_solutions:
-        # Choose
-        #print(solution["rule"])
-        used_solutions.append(solution)
-        hashable_solution = (solution["rule"], tuple(solution["groups"]), tuple(solution["squares"]))
-        # New disallowed solutions
-        new_disallowed_solutions = []
-        for disallowed_solution in disallowed_solutions:
-            new_disallowed_solutions.append(disallowed_solution)
-        new_disallowed_solutions.append(node_graph[hashable_solution])
-
-        # Recurse
-        for solved_problem in solution["groups"]:
-            if solved_problem in problems:
-                problems.remove(solved_problem)
-        chosen_set = find_chosen_set(
-            node_graph,
-            problems,
-            new_disallowed_solutions,
-            used_solutions,
-            num_not_solutions)
-        
-        #print("backtrack")
-        # Unchoose with backtracking
-        used_solutions.remove(solution)
-
-        if chosen_set is not None:
-            return chosen_set
-
-
-
-
-def evaluate(board, player):
-    """Evaluate the board for the AI player."""
-    player_groups = set(find_threats(board, player))
-    all_solutions, group_to_solutions = find_all_solutions(board, player)
-    solved_groups = [group for group in group_to_solutions]
-    
-    if player == "O":
-        node_graph = create_node_graph(all_solutions)
-        #print(len(node_graph), len(all_solutions))
-        return find_chosen_set(
-             node_graph=node_graph,
-             problems=player_groups,
-             disallowed_solutions=[],
-             used_solutions=[],
-             num_not_solutions=len(player_groups)-len(solved_groups))
-    else:
-        #print("Solved threats", len(solved_groups))
-        #print("Number of threats", len(player_groups))
-        node_graph = create_node_graph(all_solutions)
-        #print(len(node_graph), len(all_solutions))
-        return find_chosen_set(
-             node_graph=node_graph,
-             problems=player_groups,
-             disallowed_solutions=[],
-             used_solutions=[],
-             num_not_solutions=len(player_groups)-len(solved_groups))
-
-
-def create_node_graph(solutions):
+    problems = [problem for problem in problems if problem in node_graph]
+    if stats is not None:
+        stats["problems"] = len(problems)
+    # Problems by group id, the bits of the groups_mask of the Solutions.
+    problem_ids = {GROUP_IDS[problem]: i for i, problem in enumerate(problems)}
+    problems_mask = 0
+    for group_id in problem_ids:
+        problems_mask |= 1 << group_id
+
+    # Candidate Solutions, identified by their position in solutions.
+    solutions = []
+    solution_ids = {}
+    for problem in problems:
+        for solution in node_graph[problem]:
+            if id(solution) not in solution_ids:
+                solution_ids[id(solution)] = len(solutions)
+                solutions.append(solution)
+
+    rows = []
+    for solution in solutions:
+        row = []
+        solved = solution["groups_mask"] & problems_mask
+        while solved:
+            bit = solved & -solved
+            row.append(problem_ids[bit.bit_length() - 1])
+            solved ^= bit
+        rows.append(row)
+    conflicts = [[solution_ids[id(other)] for other in node_graph[hashable_solution(solution)] if id(other) in solution_ids]
+        for solution in solutions]
+
+    chosen = find_cover(len(problems), rows, conflicts, stats, max_nodes)
+    if chosen is None:
+        return []
+    return [solutions[i] for i in chosen]
+
+
+# Chosen sets of the positions evaluated last, keyed by board_key. A board and its mirror
+# image share one entry.
+evaluate_cache = LRUCache()
+
+def evaluate(board, player, stats=None):
+    """Evaluate the board for the AI player.
+    Results are cached by position and player, the returned list must not be modified.
+
+    stats: optional dictionary, filled with whether the result was cached and, when it was not,
+        the number of groups, the size and build time of the node graph and the nodes explored
+        by the search of the chosen set.
+    Returns:
+        A list with the chosen set of Solutions, or [] if victor found none."""
+    key, mirrored = board_key(board, player)
+    chosen_set = evaluate_cache.get(key)
+    if stats is not None:
+        stats["evaluate_cached"] = chosen_set is not None
+    if chosen_set is None:
+        if mirrored: # Solve the mirror image, which is the board stored in the cache.
+            board = mirror_board(board)
+        player_groups = set(find_threats(board, player))
+        if stats is not None:
+            stats["groups"] = len(player_groups)
+        all_solutions, group_to_solutions = find_all_solutions(board, player)
+        node_graph = create_node_graph(all_solutions, stats)
+        chosen_set = find_chosen_set(node_graph, player_groups, stats)
+        evaluate_cache.put(key, chosen_set)
+    if mirrored:
+        return [mirror_solution(solution) for solution in chosen_set]
+    return chosen_set
+
+
+# Rules whose combination checks only compare squares in the same columns. Two such
+# Solutions without a common column can always be combined.
+COLUMN_LOCAL_RULES = {"claimeven", "baseinverse", "vertical", "before"}
+
+def find_conflicts(solutions, stats=None):
+    """Finds, for every Solution, all Solutions that cannot be combined with it.
+
+    Instead of checking all pairs, Solutions are indexed by the columns of their squares and
+    only pairs sharing a column are checked, each pair once. Solutions of other rules are
+    checked against all Solutions.
+
+    Args:
+        solutions: a list of Solutions.
+        stats: optional dictionary, filled with the number of pairs checked and edges found.
+    Returns:
+        conflicts: a list with, for every Solution, the sorted indices of the Solutions it conflicts with.
+    """
+    conflicts = [[] for _ in solutions]
+    column_to_solutions = {}
+    global_solutions = set()
+    for i, solution in enumerate(solutions):
+        if solution["rule"] in COLUMN_LOCAL_RULES:
+            for col, column_mask in enumerate(COLUMN_MASKS):
+                if solution["columns_mask"] & column_mask:
+                    column_to_solutions.setdefault(col, []).append(i)
+        else:
+            global_solutions.add(i)
+
+    pairs_checked = 0
+    edges = 0
+
+    def check(i, j):
+        nonlocal pairs_checked, edges
+        pairs_checked += 1
+        if not combination_allowed(solutions[i], solutions[j]):
+            conflicts[i].append(j)
+            if i != j:
+                conflicts[j].append(i)
+                edges += 1
+
+    for i in range(len(solutions)):
+        check(i, i)
+    for col, indices in column_to_solutions.items():
+        for a in range(len(indices)):
+            i = indices[a]
+            for j in indices[a+1:]:
+                shared = solutions[i]["columns_mask"] & solutions[j]["columns_mask"]
+                if shared & -shared & COLUMN_MASKS[col]: # Only check the pair in the first column they share.
+                    check(i, j)
+    for i in sorted(global_solutions):
+        for j in range(len(solutions)):
+            if j != i and (j not in global_solutions or j > i):
+                check(i, j)
+
+    for indices in conflicts:
+        indices.sort()
+    if stats is not None:
+        stats["solutions"] = len(solutions)
+        stats["pairs_checked"] = pairs_checked
+        stats["graph_edges"] = edges
+    return conflicts
+
+
+def create_node_graph(solutions, stats=None):
     """Creates a graph connecting Problems and Solutions.
     Required:
         Every Problem is connected to all Solutions that solve it.
@@ -98,10 +168,13 @@ def create_node_graph(solutions):
         Every Solution is connected to all Solutions that cannot be combined with it.
     Args:
         solutions: an iterable of Solutions.
+        stats: optional dictionary, filled with the graph size and the time taken to build it.
     Returns:
         node_graph: a Dictionary of groups or Solutions to all Solutions they are connected to.
             Every Solution will at least be connected to itself.
     """
+    start = time.time()
+    solutions = list(solutions)
     node_graph = {}
 
     for solution in solutions:
@@ -111,12 +184,13 @@ def create_node_graph(solutions):
                 node_graph[group] = []
             node_graph[group].append(solution)
 
-        # TBD - Combination.py to Connect all Solutions that cannot work with solution to solution.
-        hashable_sol = (solution["rule"], tuple(solution["groups"]), tuple(solution["squares"]))
-        node_graph[hashable_sol] = []
-        for other in solutions:
-            if not combination_allowed(solution, other):
-                node_graph[hashable_sol].append(other)
+    # Connect all Solutions that cannot work with solution to solution.
+    conflicts = find_conflicts(solutions, stats)
+    for solution, indices in zip(solutions, conflicts):
+        node_graph[hashable_solution(solution)] = [solutions[j] for j in indices]
+
+    if stats is not None:
+        stats["graph_build_time"] = time.time() - start
     return node_graph
 
 
@@ -169,6 +243,10 @@ if __name__ == "__main__":
     print("Board:")
     for row in board_flip(test_diagram):
         print(row)
-    evaluated_solutions = evaluate(test_diagram, player)
+    stats = {}
+    evaluated_solutions = evaluate(test_diagram, player, stats)
+    print("Node graph:", stats)
     print("Solutions:", evaluated_solutions)
-    print("Solutions:", len(evaluated_solutions))
\ No newline at end of file
+    print("Solutions:", len(evaluated_solutions))
+    evaluate(test_diagram, player)
+    print("Evaluate cache:", evaluate_cache.stats())
\ No newline at end of file